@@ -1,3 +1,4 @@
+from typing import Literal
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -7,6 +8,67 @@ class EnvSettings(BaseSettings):
     ACCESS_TOKEN_EXPIRE_MINUTES: int
     ALGORITHM: str
 
+    # Réplicas de solo lectura (opcional). Sin réplicas todo va al primario.
+    DATABASE_REPLICA_URLS: list[str] = []
+    # Tras una escritura, las lecturas de ese usuario van al primario este tiempo
+    READ_YOUR_WRITES_SECONDS: float = 5.0
+    # Tiempo que una réplica con errores de conexión queda fuera de la rotación
+    REPLICA_RETRY_SECONDS: float = 30.0
+
+    # Adjuntos: directorio del almacén por contenido y tamaño máximo por fichero
+    ATTACHMENTS_DIR: str = "attachments"
+    ATTACHMENT_MAX_BYTES: int = 25 * 1024 * 1024
+    MESSAGE_MAX_ATTACHMENTS: int = 10
+
+    # Archivo de mensajes antiguos en segmentos comprimidos (ver app/db/archive.py)
+    ARCHIVE_DIR: str = "archive"
+    MESSAGE_ARCHIVE_AFTER_DAYS: int = 90
+    ARCHIVE_SEGMENT_MAX_MESSAGES: int = 1000
+    # Cada cuánto archiva el servidor (0: solo con `python -m app.db.run_archiver`)
+    ARCHIVE_INTERVAL_SECONDS: float = 0
+
+    # /sync solo entrega filas con más de esta antigüedad, para que ninguna
+    # haga commit por detrás del cursor (ver SyncCursor)
+    SYNC_SAFETY_WINDOW_SECONDS: float = 2.0
+
+    # Conexiones del pool que se abren al arrancar (0 para no precalentar)
+    DB_POOL_WARM_CONNECTIONS: int = 5
+    # Tiempo máximo que se espera a que se cierren los /ws al apagar
+    WS_SHUTDOWN_TIMEOUT_SECONDS: float = 5.0
+    # Intervalo con el que se limpian los buckets de rate limiting sin uso
+    RATE_LIMIT_PRUNE_SECONDS: float = 60.0
+
+    # Tamaño de la cola de frames pendientes de persistir por conexión /ws
+    WS_WORK_QUEUE_SIZE: int = 100
+    # Agrupación opcional de frames salientes (/ws?batch=true)
+    WS_BATCH_WINDOW_SECONDS: float = 0.02
+    WS_BATCH_MAX_EVENTS: int = 50
+    # Intervalo con el que se escriben y difunden las confirmaciones de lectura
+    RECEIPTS_FLUSH_SECONDS: float = 1.0
+
+    # Rate limiting: (tokens por segundo, tamaño del burst). El de auth va por
+    # IP: detrás de un proxy uvicorn necesita --forwarded-allow-ips para ver
+    # la del cliente
+    RATE_LIMIT_ENABLED: bool = True
+    AUTH_RATE_LIMIT: tuple[float, int] = (0.2, 5)
+    WS_DEFAULT_RATE_LIMIT: tuple[float, int] = (10.0, 20)
+    WS_RATE_LIMITS: dict[str, tuple[float, int]] = {
+        "send_message": (5.0, 10),
+        "typing": (2.0, 5),
+        "subscribe_chat": (10.0, 50),
+        "unsubscribe_chat": (10.0, 50),
+        "new_chat": (1.0, 5),
+        "ack_delivered": (20.0, 100),
+        "mark_read": (20.0, 100),
+    }
+
+    # Trazas por petición y por evento /ws: consultas, tiempo en BD y las más lentas
+    TRACING_ENABLED: bool = False
+    TRACING_EXPORTER: Literal["jsonl", "sentry"] = "jsonl"
+    TRACING_JSONL_PATH: str = "traces.jsonl"
+    TRACING_SLOWEST_STATEMENTS: int = 5
+    SENTRY_DSN: str | None = None
+
     model_config = SettingsConfigDict(env_file=".env")
 
 
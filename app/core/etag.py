@@ -0,0 +1,37 @@
+from fastapi import Request, Response, status
+
+
+def make_etag(*parts: object) -> str:
+    """Construye un ETag débil a partir de identificadores y contadores de versión"""
+    return 'W/"' + "-".join(str(part) for part in parts) + '"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Comprueba If-None-Match (comparación débil, admite listas y `*`)"""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+
+    opaque = etag.removeprefix("W/")
+    for candidate in if_none_match.split(","):
+        if candidate.strip().removeprefix("W/") == opaque:
+            return True
+    return False
+
+
+def etag_headers(etag: str) -> dict[str, str]:
+    return {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+
+def immutable_headers(etag: str) -> dict[str, str]:
+    """Cabeceras para contenido que nunca cambia bajo la misma URL"""
+    return {"ETag": etag, "Cache-Control": "private, max-age=31536000, immutable"}
+
+
+def not_modified(etag: str, headers: dict[str, str] | None = None) -> Response:
+    return Response(
+        status_code=status.HTTP_304_NOT_MODIFIED,
+        headers=headers if headers is not None else etag_headers(etag),
+    )
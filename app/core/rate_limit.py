@@ -0,0 +1,174 @@
+import heapq
+import math
+import threading
+import time
+from typing import Protocol
+from fastapi import HTTPException, Request, status
+from app.core.env_config import EnvSettings
+
+_monotonic = time.monotonic
+
+
+class RateLimitStore(Protocol):
+    """Interfaz del almacenamiento de buckets.
+
+    Una implementación compartida (Redis, etc.) solo necesita cumplir `consume`.
+    """
+
+    def consume(self, key: object, rate: float, burst: int, cost: float = 1.0) -> float:
+        """Consume `cost` tokens del bucket `key`.
+
+        Devuelve 0.0 si la petición se permite, o los segundos que faltan
+        para que haya tokens suficientes si se rechaza.
+        """
+        ...
+
+    def retry_after(
+        self, key: object, rate: float, burst: int, cost: float = 1.0
+    ) -> float:
+        """Como `consume` pero sin gastar tokens"""
+        ...
+
+
+class InMemoryRateLimitStore:
+    """Token buckets en memoria del proceso: dict[key, [tokens, last_refill]]
+
+    Las rutas sync de auth lo usan desde el threadpool mientras el event loop
+    atiende /ws y la limpieza periódica, así que todo acceso va con un lock.
+    """
+
+    def __init__(self, max_keys: int = 100_000):
+        self.buckets: dict[object, list[float]] = {}
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+
+    def consume(self, key: object, rate: float, burst: int, cost: float = 1.0) -> float:
+        with self._lock:
+            now = _monotonic()
+            bucket = self.buckets.get(key)
+
+            if bucket is None:
+                if len(self.buckets) >= self.max_keys:
+                    self._prune(now)
+                self.buckets[key] = [burst - cost, now]
+                return 0.0
+
+            tokens = bucket[0] + (now - bucket[1]) * rate
+            if tokens > burst:
+                tokens = burst
+            bucket[1] = now
+
+            if tokens >= cost:
+                bucket[0] = tokens - cost
+                return 0.0
+
+            bucket[0] = tokens
+            return (cost - tokens) / rate
+
+    def retry_after(
+        self, key: object, rate: float, burst: int, cost: float = 1.0
+    ) -> float:
+        with self._lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                return 0.0
+            tokens = min(burst, bucket[0] + (_monotonic() - bucket[1]) * rate)
+        return 0.0 if tokens >= cost else (cost - tokens) / rate
+
+    def prune(self, now: float | None = None):
+        """Elimina los buckets que llevan tiempo sin usarse (ya estarían llenos).
+
+        Si aun así no cabe uno nuevo se expulsa el 10% que lleva más tiempo
+        sin usarse, en vez de vaciarlo todo y devolver sus tokens a todos.
+        """
+        with self._lock:
+            self._prune(time.monotonic() if now is None else now)
+
+    def _prune(self, now: float):
+        idle = [key for key, (_, last) in self.buckets.items() if now - last > 300]
+        for key in idle:
+            del self.buckets[key]
+        if len(self.buckets) >= self.max_keys:
+            evict = len(self.buckets) - self.max_keys + max(1, self.max_keys // 10)
+            oldest = heapq.nsmallest(
+                evict, self.buckets.items(), key=lambda item: item[1][1]
+            )
+            for key, _ in oldest:
+                del self.buckets[key]
+
+    def reset(self):
+        with self._lock:
+            self.buckets.clear()
+
+
+class WebSocketRateLimiter:
+    """Limita los frames de /ws por usuario y por tipo de mensaje"""
+
+    def __init__(self, store: RateLimitStore, settings: EnvSettings):
+        self.store = store
+        self.settings = settings
+        self.limits = settings.WS_RATE_LIMITS
+        self.default = settings.WS_DEFAULT_RATE_LIMIT
+
+    def check(self, user_id: object, message_type: object) -> float:
+        """Devuelve 0.0 si el frame se permite o el retry_after en segundos.
+
+        Los tipos sin límite propio comparten un único bucket por usuario, así
+        que un cliente no puede crear claves nuevas inventando tipos.
+        """
+        if not self.settings.RATE_LIMIT_ENABLED:
+            return 0.0
+        if not isinstance(message_type, str) or message_type not in self.limits:
+            message_type = "*"
+        rate, burst = self.limits.get(message_type, self.default)
+        return self.store.consume((user_id, message_type), rate, burst)
+
+
+def _too_many_requests(retry_after: float) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Too many requests",
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+def check_auth_rate_limit(request: Request, email: str | None = None):
+    """Aplica el límite de las rutas de auth por IP y, si se conoce, por email.
+
+    Cada petición gasta del bucket de su IP en esa ruta, así que registrarse
+    no gasta los intentos de login. El del email solo se comprueba: lo gastan
+    los intentos fallidos (`record_failed_login`), así que otra persona no
+    puede bloquear el login de alguien solo con conocer su email.
+
+    La IP es `request.client.host`. Detrás de un proxy (Render, Railway,
+    ngrok) uvicorn solo la toma de X-Forwarded-For si el proxy está en
+    `--forwarded-allow-ips` (o FORWARDED_ALLOW_IPS); si no, es la del proxy
+    y todos los clientes comparten un mismo bucket.
+    """
+    settings: EnvSettings = request.app.state.settings
+    if not settings.RATE_LIMIT_ENABLED:
+        return
+
+    rate_limit_store: RateLimitStore = request.app.state.rate_limit_store
+    rate, burst = settings.AUTH_RATE_LIMIT
+    client_ip = request.client.host if request.client else "unknown"
+
+    retry_after = rate_limit_store.consume(
+        ("auth_ip", request.url.path, client_ip), rate, burst
+    )
+    if retry_after:
+        raise _too_many_requests(retry_after)
+
+    if email:
+        retry_after = rate_limit_store.retry_after(("auth_email", email), rate, burst)
+        if retry_after:
+            raise _too_many_requests(retry_after)
+
+
+def record_failed_login(request: Request, email: str):
+    """Gasta un token del bucket del email tras un login fallido"""
+    settings: EnvSettings = request.app.state.settings
+    if not settings.RATE_LIMIT_ENABLED:
+        return
+    rate, burst = settings.AUTH_RATE_LIMIT
+    request.app.state.rate_limit_store.consume(("auth_email", email), rate, burst)
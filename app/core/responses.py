@@ -0,0 +1,15 @@
+from typing import Any
+from fastapi import Response
+from pydantic import TypeAdapter
+
+
+class SerializedJSONResponse(Response):
+    """Respuesta con un cuerpo JSON ya serializado (sin pasar por jsonable_encoder)"""
+
+    media_type = "application/json"
+
+
+def serialized_response(
+    serializer: TypeAdapter[Any], content: Any, headers: dict[str, str] | None = None
+) -> SerializedJSONResponse:
+    return SerializedJSONResponse(serializer.dump_json(content), headers=headers)
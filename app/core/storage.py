@@ -0,0 +1,71 @@
+import hashlib
+import os
+import tempfile
+from collections.abc import AsyncIterator
+from pathlib import Path
+from starlette.concurrency import run_in_threadpool
+from app.core.env_config import env
+
+
+class FileTooLarge(Exception):
+    pass
+
+
+class ContentAddressedStore:
+    """Almacén de ficheros en disco direccionado por sha256.
+
+    Cada fichero se guarda en `root/ab/cd/abcd...`. Una subida se escribe a un
+    temporal mientras se calcula el hash y al terminar se renombra a su ruta
+    final; si ya existía un fichero con ese hash se descarta el temporal.
+    """
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def path_for(self, sha256: str) -> Path:
+        return self.root / sha256[:2] / sha256[2:4] / sha256
+
+    async def save(
+        self, chunks: AsyncIterator[bytes], max_bytes: int
+    ) -> tuple[str, int]:
+        """Guarda el contenido de `chunks` y devuelve (sha256, tamaño).
+
+        Lanza `FileTooLarge` en cuanto se superan `max_bytes`, sin leer el resto.
+        """
+        tmp_dir = self.root / "tmp"
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        digest = hashlib.sha256()
+        size = 0
+
+        try:
+            with os.fdopen(fd, "wb") as file:
+                async for chunk in chunks:
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise FileTooLarge()
+                    # hashlib y write sueltan el GIL con bloques grandes
+                    await run_in_threadpool(_write_chunk, file, digest, chunk)
+
+            sha256 = digest.hexdigest()
+            path = self.path_for(sha256)
+            if path.exists():
+                os.remove(tmp_path)
+            else:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        return sha256, size
+
+
+def _write_chunk(file, digest, chunk: bytes):
+    digest.update(chunk)
+    file.write(chunk)
+
+
+# Almacén compartido de adjuntos
+attachment_store = ContentAddressedStore(env.ATTACHMENTS_DIR)
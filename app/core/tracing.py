@@ -0,0 +1,245 @@
+import heapq
+import json
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import AbstractContextManager, contextmanager, nullcontext
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import UTC, datetime
+from typing import Any, Protocol
+from sqlalchemy import Engine, event
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.core.env_config import env
+
+# Longitud máxima de una sentencia SQL guardada en una traza
+STATEMENT_MAX_LENGTH = 1000
+
+
+@dataclass
+class Trace:
+    """Consultas ejecutadas durante una petición HTTP o un evento /ws"""
+
+    kind: str
+    name: str
+    slowest_limit: int
+    started_at: float = field(default_factory=time.time)
+    duration: float = 0.0
+    status: int | None = None
+    query_count: int = 0
+    db_time: float = 0.0
+    # heap de (duración, inicio relativo a la traza, sentencia)
+    slowest: list[tuple[float, float, str]] = field(default_factory=list)
+    _start: float = field(default_factory=time.perf_counter)
+
+    def record_query(self, statement: str, started: float, duration: float):
+        self.query_count += 1
+        self.db_time += duration
+        item = (duration, started - self._start, statement[:STATEMENT_MAX_LENGTH])
+        if len(self.slowest) < self.slowest_limit:
+            heapq.heappush(self.slowest, item)
+        elif self.slowest_limit:
+            heapq.heappushpop(self.slowest, item)
+
+    def finish(self):
+        self.duration = time.perf_counter() - self._start
+
+    def slowest_statements(self) -> list[tuple[float, float, str]]:
+        return sorted(self.slowest, reverse=True)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "kind": self.kind,
+            "name": self.name,
+            "started_at": datetime.fromtimestamp(self.started_at, UTC).isoformat(),
+            "duration_ms": round(self.duration * 1000, 3),
+            "status": self.status,
+            "query_count": self.query_count,
+            "db_time_ms": round(self.db_time * 1000, 3),
+            "slowest": [
+                {
+                    "duration_ms": round(duration * 1000, 3),
+                    "offset_ms": round(offset * 1000, 3),
+                    "statement": statement,
+                }
+                for duration, offset, statement in self.slowest_statements()
+            ],
+        }
+
+
+class SpanExporter(Protocol):
+    def export(self, trace: Trace) -> None: ...
+
+
+class JsonlSpanExporter:
+    """Añade cada traza como una línea JSON a un fichero local"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+
+    def export(self, trace: Trace):
+        line = json.dumps(trace.to_dict(), ensure_ascii=False) + "\n"
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8", buffering=1)
+            self._file.write(line)
+
+
+class SentrySpanExporter:
+    """Envía cada traza como una transacción de Sentry con las consultas más
+    lentas como spans hijos"""
+
+    def __init__(self, dsn: str | None = None):
+        import sentry_sdk
+
+        self.sentry_sdk = sentry_sdk
+        if dsn and not sentry_sdk.is_initialized():
+            sentry_sdk.init(dsn=dsn, traces_sample_rate=1.0)
+
+    def export(self, trace: Trace):
+        start = datetime.fromtimestamp(trace.started_at, UTC)
+        transaction = self.sentry_sdk.start_transaction(
+            op=f"{trace.kind}.server", name=trace.name, start_timestamp=start
+        )
+        transaction.set_data("db.query_count", trace.query_count)
+        transaction.set_data("db.total_time_ms", round(trace.db_time * 1000, 3))
+        if trace.status is not None:
+            transaction.set_http_status(trace.status)
+
+        for duration, offset, statement in trace.slowest_statements():
+            span_start = start.timestamp() + offset
+            span = transaction.start_child(
+                op="db",
+                name=statement,
+                start_timestamp=datetime.fromtimestamp(span_start, UTC),
+            )
+            span.finish(
+                end_timestamp=datetime.fromtimestamp(span_start + duration, UTC)
+            )
+
+        transaction.finish(
+            end_timestamp=datetime.fromtimestamp(trace.started_at + trace.duration, UTC)
+        )
+
+
+_current_trace: ContextVar[Trace | None] = ContextVar("current_trace", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_trace.get() is not None:
+        conn.info.setdefault("trace_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    trace = _current_trace.get()
+    starts = conn.info.get("trace_query_start")
+    if trace is None or not starts:
+        return
+    started = starts.pop()
+    trace.record_query(statement, started, time.perf_counter() - started)
+
+
+def instrument_engine(engine: Engine):
+    """Registra los listeners que atribuyen cada consulta a la traza actual"""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class Tracer:
+    def __init__(self, enabled: bool, slowest_limit: int):
+        self.enabled = enabled
+        self.slowest_limit = slowest_limit
+        self._exporter: SpanExporter | None = None
+
+    @property
+    def exporter(self) -> SpanExporter:
+        if self._exporter is None:
+            if env.TRACING_EXPORTER == "sentry":
+                self._exporter = SentrySpanExporter(env.SENTRY_DSN)
+            else:
+                self._exporter = JsonlSpanExporter(env.TRACING_JSONL_PATH)
+        return self._exporter
+
+    @exporter.setter
+    def exporter(self, exporter: SpanExporter):
+        self._exporter = exporter
+
+    @contextmanager
+    def _span(self, kind: str, name: str) -> Iterator[Trace]:
+        trace = Trace(kind, name, self.slowest_limit)
+        token = _current_trace.set(trace)
+        try:
+            yield trace
+        finally:
+            _current_trace.reset(token)
+            trace.finish()
+            try:
+                self.exporter.export(trace)
+            except Exception as e:
+                print(f"Error exporting trace {name}: {e}")
+
+    def span(self, kind: str, name: str) -> AbstractContextManager[Trace | None]:
+        """Traza el bloque si el tracing está activado (no hace nada si no)"""
+        if not self.enabled:
+            return nullcontext()
+        return self._span(kind, name)
+
+
+class TracingMiddleware:
+    """Middleware ASGI que abre una traza por cada petición HTTP"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        with tracer._span("http", scope["path"]) as trace:
+
+            async def send_wrapper(message: Message):
+                if message["type"] == "http.response.start":
+                    trace.status = message["status"]
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                # Se usa la plantilla de la ruta (/chat/{chat_id}) para agrupar
+                route = scope.get("route")
+                path = getattr(route, "path", None) or scope["path"]
+                trace.name = f"{scope['method']} {path}"
+
+
+@contextmanager
+def assert_max_queries(max_queries: int, engine: Engine):
+    """Falla si el bloque ejecuta más de `max_queries` consultas en `engine`.
+
+    Pensado para tests y comprobaciones de CI que detecten regresiones N+1:
+
+        with assert_max_queries(3, app.state.engine):
+            client.get(f"/chat/{chat_id}", headers=headers)
+    """
+    statements: list[str] = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "after_cursor_execute", count)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "after_cursor_execute", count)
+
+    if len(statements) > max_queries:
+        listing = "\n".join(f"  {statement}" for statement in statements)
+        raise AssertionError(
+            f"Expected at most {max_queries} queries, got {len(statements)}:\n{listing}"
+        )
+
+
+tracer = Tracer(env.TRACING_ENABLED, env.TRACING_SLOWEST_STATEMENTS)
@@ -0,0 +1,341 @@
+"""Archivo de mensajes antiguos.
+
+Los mensajes con más de `MESSAGE_ARCHIVE_AFTER_DAYS` días se mueven de la
+tabla `message` a segmentos comprimidos en disco, uno o varios por chat:
+
+    ARCHIVE_DIR/ab/<chat_id>/index.json
+    ARCHIVE_DIR/ab/<chat_id>/<primer sent_at>-<sufijo>.jsonl.gz
+
+Cada segmento guarda hasta `ARCHIVE_SEGMENT_MAX_MESSAGES` mensajes en orden
+(sent_at, id) y el índice guarda, por segmento, el primer y el último mensaje,
+así una página del historial solo descomprime los segmentos que necesita.
+Como se archiva todo lo anterior a un corte, los mensajes archivados de un
+chat son siempre más antiguos que los que siguen en la tabla.
+
+Se puede ejecutar una vez (por ejemplo desde cron) con:
+
+    python -m app.db.run_archiver
+"""
+
+import fcntl
+import gzip
+import json
+import os
+import tempfile
+import uuid
+from collections.abc import Iterator
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, TypedDict
+from sqlalchemy import Engine, delete, distinct, text
+from sqlmodel import Session, col, select
+from app.core.env_config import env
+from app.db.versioning import bump_chat_version
+from app.models.chat_model import Attachment, Message
+
+
+class ArchivedMessage(TypedDict):
+    id: uuid.UUID
+    content: str
+    sent_at: datetime
+    sender_id: uuid.UUID
+    attachments: list[dict[str, Any]]
+
+
+class MessageArchive:
+    def __init__(self, root: str, segment_max_messages: int):
+        self.root = Path(root)
+        self.segment_max_messages = segment_max_messages
+
+    def chat_dir(self, chat_id: uuid.UUID) -> Path:
+        return self.root / chat_id.hex[:2] / str(chat_id)
+
+    def read_index(self, chat_id: uuid.UUID) -> list[dict[str, Any]]:
+        path = self.chat_dir(chat_id) / "index.json"
+        try:
+            return json.loads(path.read_text())["segments"]
+        except FileNotFoundError:
+            return []
+
+    def write_segment(self, chat_id: uuid.UUID, messages: list[ArchivedMessage]):
+        """Escribe un segmento nuevo y lo añade al índice del chat.
+
+        Ambos ficheros se escriben a un temporal y se renombran, así que un
+        lector nunca ve un segmento a medias.
+        """
+        chat_dir = self.chat_dir(chat_id)
+        chat_dir.mkdir(parents=True, exist_ok=True)
+
+        first, last = messages[0], messages[-1]
+        name = f"{first['sent_at']:%Y%m%dT%H%M%S%f}-{uuid.uuid4().hex[:8]}.jsonl.gz"
+        lines = b"".join(
+            json.dumps(_dump_message(message), ensure_ascii=False).encode() + b"\n"
+            for message in messages
+        )
+        _atomic_write(chat_dir / name, gzip.compress(lines))
+
+        segments = self.read_index(chat_id)
+        segments.append(
+            {
+                "file": name,
+                "count": len(messages),
+                "first": [first["sent_at"].isoformat(), str(first["id"])],
+                "last": [last["sent_at"].isoformat(), str(last["id"])],
+            }
+        )
+        _atomic_write(
+            chat_dir / "index.json", json.dumps({"segments": segments}).encode()
+        )
+
+    def last_segment_ids(self, chat_id: uuid.UUID) -> set[uuid.UUID]:
+        """Ids del último segmento del chat (vacío si no tiene ninguno)"""
+        segments = self.read_index(chat_id)
+        if not segments:
+            return set()
+        path = self.chat_dir(chat_id) / segments[-1]["file"]
+        return {message["id"] for message in _load_segment(str(path))}
+
+    def read_before(
+        self,
+        chat_id: uuid.UUID,
+        before: tuple[datetime, uuid.UUID] | None,
+        limit: int,
+    ) -> list[ArchivedMessage]:
+        """Hasta `limit` mensajes archivados anteriores a `before` (sent_at, id),
+        del más reciente al más antiguo"""
+        result: list[ArchivedMessage] = []
+        for segment in reversed(self.read_index(chat_id)):
+            if before is not None:
+                first = (
+                    datetime.fromisoformat(segment["first"][0]),
+                    uuid.UUID(segment["first"][1]),
+                )
+                if first >= before:
+                    continue
+
+            for message in reversed(
+                _load_segment(str(self.chat_dir(chat_id) / segment["file"]))
+            ):
+                if before is None or (message["sent_at"], message["id"]) < before:
+                    result.append(message)
+                    if len(result) == limit:
+                        return result
+        return result
+
+
+def _dump_message(message: ArchivedMessage) -> dict[str, Any]:
+    return {
+        "id": str(message["id"]),
+        "content": message["content"],
+        "sent_at": message["sent_at"].isoformat(),
+        "sender_id": str(message["sender_id"]),
+        "attachments": message["attachments"],
+    }
+
+
+@lru_cache(maxsize=64)
+def _load_segment(path: str) -> tuple[ArchivedMessage, ...]:
+    # Los segmentos no cambian nunca una vez escritos, así que se pueden cachear
+    with gzip.open(path, "rt", encoding="utf-8") as file:
+        return tuple(
+            {
+                "id": uuid.UUID(data["id"]),
+                "content": data["content"],
+                "sent_at": datetime.fromisoformat(data["sent_at"]),
+                "sender_id": uuid.UUID(data["sender_id"]),
+                "attachments": data["attachments"],
+            }
+            for data in map(json.loads, file)
+        )
+
+
+def _atomic_write(path: Path, data: bytes):
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent)
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+@contextmanager
+def _archive_lock(root: Path) -> Iterator[bool]:
+    """Evita que dos workers archiven a la vez; devuelve False si ya hay otro"""
+    root.mkdir(parents=True, exist_ok=True)
+    with open(root / ".lock", "w") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _archive_chat(session: Session, chat_id: uuid.UUID, cutoff: datetime) -> int:
+    archived = 0
+    while True:
+        rows = session.exec(
+            select(
+                col(Message.id),
+                col(Message.content),
+                col(Message.sent_at),
+                col(Message.sender_id),
+            )
+            .where(Message.chat_id == chat_id)
+            .where(col(Message.sent_at) < cutoff)
+            .order_by(col(Message.sent_at), col(Message.id))
+            .limit(message_archive.segment_max_messages)
+        ).all()
+        if not rows:
+            return archived
+
+        message_ids = [row[0] for row in rows]
+        attachments: dict[uuid.UUID, list[dict[str, Any]]] = {}
+        for message_id, id, filename, content_type, size in session.exec(
+            select(
+                col(Attachment.message_id),
+                col(Attachment.id),
+                col(Attachment.filename),
+                col(Attachment.content_type),
+                col(Attachment.size),
+            ).where(col(Attachment.message_id).in_(message_ids))
+        ).all():
+            attachments.setdefault(message_id, []).append(
+                {
+                    "id": str(id),
+                    "filename": filename,
+                    "content_type": content_type,
+                    "size": size,
+                }
+            )
+
+        # Primero el segmento y después el borrado: si el commit falla, los
+        # mensajes siguen en la tabla y ya están en el último segmento. En la
+        # siguiente pasada solo se borran, sin volver a archivarlos.
+        already_archived = message_archive.last_segment_ids(chat_id)
+        pending = [
+            {
+                "id": id,
+                "content": content,
+                "sent_at": sent_at,
+                "sender_id": sender_id,
+                "attachments": attachments.get(id, []),
+            }
+            for id, content, sent_at, sender_id in rows
+            if id not in already_archived
+        ]
+        if pending:
+            message_archive.write_segment(chat_id, pending)
+        session.exec(delete(Message).where(col(Message.id).in_(message_ids)))
+        # GET /chat/{id} deja de devolver estos mensajes: cambia su ETag
+        bump_chat_version(session, chat_id)
+        session.commit()
+        archived += len(rows)
+
+
+def archive_messages(engine: Engine, cutoff: datetime) -> int:
+    """Archiva los mensajes anteriores a `cutoff` y devuelve cuántos se movieron"""
+    with _archive_lock(message_archive.root) as acquired:
+        if not acquired:
+            return 0
+
+        archived = 0
+        with Session(engine) as session:
+            chat_ids = session.exec(
+                select(distinct(Message.chat_id)).where(col(Message.sent_at) < cutoff)
+            ).all()
+            for chat_id in chat_ids:
+                archived += _archive_chat(session, chat_id, cutoff)
+
+        if engine.dialect.name == "postgresql":
+            drop_archived_partitions(engine, cutoff)
+        return archived
+
+
+def run_archiver(engine: Engine) -> int:
+    """Archiva en el primario lo anterior a `MESSAGE_ARCHIVE_AFTER_DAYS`"""
+    cutoff = datetime.now() - timedelta(days=env.MESSAGE_ARCHIVE_AFTER_DAYS)
+    return archive_messages(engine, cutoff)
+
+
+# Particiones mensuales de `message` en Postgres (ver la migración
+# message_time_partitions). Se llaman message_pYYYYMM.
+
+
+def _month_start(value: datetime) -> datetime:
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _next_month(value: datetime) -> datetime:
+    return (value.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+def ensure_message_partitions(engine: Engine, months_ahead: int = 2):
+    """Crea las particiones del mes actual y de los siguientes si no existen"""
+    if engine.dialect.name != "postgresql":
+        return
+
+    start = _month_start(datetime.now())
+    with engine.begin() as connection:
+        # Sin la migración de particiones `message` es una tabla normal
+        is_partitioned = connection.execute(
+            text(
+                "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table "
+                "WHERE partrelid = 'message'::regclass)"
+            )
+        ).scalar()
+        if not is_partitioned:
+            return
+
+        for _ in range(months_ahead + 1):
+            end = _next_month(start)
+            connection.execute(
+                text(
+                    f"CREATE TABLE IF NOT EXISTS message_p{start:%Y%m} "
+                    f"PARTITION OF message FOR VALUES FROM ('{start:%Y-%m-%d}') "
+                    f"TO ('{end:%Y-%m-%d}')"
+                )
+            )
+            start = end
+
+
+def drop_archived_partitions(engine: Engine, cutoff: datetime):
+    """Elimina las particiones mensuales ya vacías que quedan antes del corte.
+
+    DROP TABLE devuelve el espacio al momento, sin esperar al vacuum de los
+    DELETE del archivado.
+    """
+    with engine.begin() as connection:
+        names = (
+            connection.execute(
+                text(
+                    "SELECT c.relname FROM pg_inherits i "
+                    "JOIN pg_class c ON c.oid = i.inhrelid "
+                    "WHERE i.inhparent = 'message'::regclass "
+                    "AND c.relname ~ '^message_p[0-9]{6}$'"
+                )
+            )
+            .scalars()
+            .all()
+        )
+        for name in names:
+            month = datetime.strptime(name.removeprefix("message_p"), "%Y%m")
+            if _next_month(month) > cutoff:
+                continue
+            is_empty = connection.execute(
+                text(f"SELECT NOT EXISTS (SELECT 1 FROM {name})")
+            ).scalar()
+            if is_empty:
+                connection.execute(text(f"DROP TABLE {name}"))
+
+
+# Archivo compartido de mensajes
+message_archive = MessageArchive(env.ARCHIVE_DIR, env.ARCHIVE_SEGMENT_MAX_MESSAGES)
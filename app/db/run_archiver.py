@@ -0,0 +1,14 @@
+"""Archiva una vez los mensajes antiguos, por ejemplo desde cron:
+
+python -m app.db.run_archiver
+"""
+
+from app.core.env_config import env
+from app.db.archive import ensure_message_partitions, run_archiver
+from app.db.session import create_db_engine
+
+if __name__ == "__main__":
+    engine = create_db_engine(env)
+    engine.echo = False
+    ensure_message_partitions(engine)
+    print(f"Archived {run_archiver(engine)} messages")
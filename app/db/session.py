@@ -1,19 +1,235 @@
-from typing import Annotated
-from fastapi import Depends
+import itertools
+import time
+import uuid
+from collections.abc import Callable
+from typing import Annotated, Any
+import jwt
+from fastapi import Depends, Request
+from sqlalchemy import Engine
+from sqlalchemy.exc import OperationalError
 from sqlmodel import create_engine, SQLModel, Session
-from app.core.env_config import env
+from starlette.datastructures import MutableHeaders
+from starlette.requests import HTTPConnection
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.core.env_config import EnvSettings
 from app import models
 
-engine = create_engine(str(env.DATABASE_URL), echo=True)
 
+def create_db_engine(settings: EnvSettings) -> Engine:
+    return create_engine(str(settings.DATABASE_URL), echo=True)
 
-def init_db():
+
+def init_db(engine: Engine):
     SQLModel.metadata.create_all(engine)
 
 
-def get_session():
-    with Session(engine) as session:
+def get_session(connection: HTTPConnection):
+    """Sesión sobre el motor de la aplicación (sirve también para /ws)"""
+    with Session(connection.app.state.engine) as session:
         yield session
 
 
 SessionDep = Annotated[Session, Depends(get_session)]
+
+
+def warm_up_pool(engine: Engine, connections: int):
+    """Abre conexiones del pool por adelantado para que las primeras
+    peticiones tras arrancar no paguen el connect"""
+    pool_size = getattr(engine.pool, "size", None)
+    if callable(pool_size):
+        connections = min(connections, pool_size())
+
+    opened = []
+    try:
+        for _ in range(connections):
+            connection = engine.connect()
+            connection.exec_driver_sql("SELECT 1")
+            opened.append(connection)
+    finally:
+        for connection in opened:
+            connection.close()
+
+
+class ReplicaRouter:
+    """Reparte las lecturas entre réplicas con round-robin.
+
+    Una réplica que falla con un error de conexión sale de la rotación durante
+    `retry_seconds`; si no queda ninguna sana se lee del primario. Tras una
+    escritura de un usuario, sus lecturas van al primario durante
+    `sticky_seconds` para que vea sus propios cambios.
+
+    `_sticky_until` es memoria del proceso: con varios workers solo lo ve el
+    que atendió la escritura. Para las escrituras HTTP lo cubre además la
+    cookie de `ReadYourWritesMiddleware`, que llega a cualquier worker; las
+    escrituras por /ws solo son visibles en su propio proceso.
+    """
+
+    def __init__(
+        self,
+        primary: Engine,
+        replicas: list[Engine],
+        sticky_seconds: float,
+        retry_seconds: float,
+    ):
+        self.primary = primary
+        self.replicas = replicas
+        self.sticky_seconds = sticky_seconds
+        self.retry_seconds = retry_seconds
+        self._next_replica = itertools.cycle(replicas)
+        # dict[engine, instante a partir del cual se vuelve a probar]
+        self._unhealthy_until: dict[Engine, float] = {}
+        # dict[user_id, instante hasta el que sus lecturas van al primario]
+        self._sticky_until: dict[str, float] = {}
+
+    def mark_write(self, user_id: uuid.UUID | str):
+        """Registra una escritura del usuario (read-your-writes)"""
+        if not self.replicas:
+            return
+        now = time.monotonic()
+        if len(self._sticky_until) > 10_000:
+            self._sticky_until = {
+                key: until for key, until in self._sticky_until.items() if until > now
+            }
+        self._sticky_until[str(user_id)] = now + self.sticky_seconds
+
+    def mark_unhealthy(self, engine: Engine):
+        if engine is not self.primary:
+            self._unhealthy_until[engine] = time.monotonic() + self.retry_seconds
+
+    def choose(self, user_id: str | None = None) -> Engine:
+        if not self.replicas:
+            return self.primary
+
+        now = time.monotonic()
+        if user_id is not None and self._sticky_until.get(user_id, 0.0) > now:
+            return self.primary
+
+        for _ in range(len(self.replicas)):
+            replica = next(self._next_replica)
+            if self._unhealthy_until.get(replica, 0.0) <= now:
+                return replica
+        return self.primary
+
+
+def create_replica_router(settings: EnvSettings, primary: Engine) -> ReplicaRouter:
+    return ReplicaRouter(
+        primary,
+        # pre_ping detecta al sacar la conexión del pool una réplica caída
+        [
+            create_engine(url, echo=True, pool_pre_ping=True)
+            for url in settings.DATABASE_REPLICA_URLS
+        ],
+        sticky_seconds=settings.READ_YOUR_WRITES_SECONDS,
+        retry_seconds=settings.REPLICA_RETRY_SECONDS,
+    )
+
+
+def get_replica_router(request: Request) -> ReplicaRouter:
+    return request.app.state.replica_router
+
+
+def _request_user_id(request: Request) -> str | None:
+    """Lee el id del usuario del bearer token sin verificarlo.
+
+    Solo se usa para elegir la base de datos; la autenticación la sigue
+    haciendo `verify_token` en cada ruta.
+    """
+    authorization = request.headers.get("authorization")
+    if not authorization or not authorization.lower().startswith("bearer "):
+        return None
+    try:
+        payload = jwt.decode(authorization[7:], options={"verify_signature": False})
+    except jwt.PyJWTError:
+        return None
+    user_id = payload.get("id")
+    return str(user_id) if user_id else None
+
+
+# Cookie con el instante (epoch) hasta el que las lecturas van al primario
+READ_PRIMARY_COOKIE = "read_primary_until"
+_WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+
+class ReadYourWritesMiddleware:
+    """Marca con una cookie las respuestas a escrituras HTTP correctas.
+
+    Así las lecturas siguientes del mismo cliente van al primario aunque las
+    atienda otro worker distinto del que hizo la escritura.
+    """
+
+    def __init__(self, app: ASGIApp, sticky_seconds: float):
+        self.app = app
+        self.sticky_seconds = sticky_seconds
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] not in _WRITE_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                until = time.time() + self.sticky_seconds
+                MutableHeaders(scope=message).append(
+                    "set-cookie",
+                    f"{READ_PRIMARY_COOKIE}={until:.3f}; "
+                    f"Max-Age={int(self.sticky_seconds) + 1}; Path=/; "
+                    "HttpOnly; SameSite=Lax",
+                )
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+def _wrote_recently(request: Request) -> bool:
+    try:
+        return float(request.cookies.get(READ_PRIMARY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+class ReadSession(Session):
+    """Sesión de lectura que repite en el primario lo que falla en una réplica.
+
+    Si una consulta da OperationalError (réplica caída o que cortó la
+    conexión), la réplica sale de la rotación y la consulta se repite una vez
+    en el primario; el resto de la petición sigue en el primario. Solo se usa
+    para rutas de solo lectura, así que repetir la consulta no tiene efectos.
+    """
+
+    def __init__(self, router: ReplicaRouter, bind: Engine):
+        super().__init__(bind)
+        self.router = router
+
+    def _on_primary(self, run: Callable[[], Any]) -> Any:
+        try:
+            return run()
+        except OperationalError:
+            replica = self.get_bind()
+            if replica is self.router.primary:
+                raise
+            self.router.mark_unhealthy(replica)
+            self.rollback()
+            self.bind = self.router.primary
+            return run()
+
+    def exec(self, *args: Any, **kwargs: Any) -> Any:
+        return self._on_primary(lambda: super(ReadSession, self).exec(*args, **kwargs))
+
+    def execute(self, *args: Any, **kwargs: Any) -> Any:
+        return self._on_primary(
+            lambda: super(ReadSession, self).execute(*args, **kwargs)
+        )
+
+
+def get_read_session(request: Request):
+    """Sesión para rutas de solo lectura (réplica si hay alguna configurada)"""
+    replica_router: ReplicaRouter = request.app.state.replica_router
+    if not replica_router.replicas or _wrote_recently(request):
+        read_engine = replica_router.primary
+    else:
+        read_engine = replica_router.choose(_request_user_id(request))
+    with ReadSession(replica_router, read_engine) as session:
+        yield session
+
+
+ReadSessionDep = Annotated[Session, Depends(get_read_session)]
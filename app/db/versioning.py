@@ -0,0 +1,62 @@
+import uuid
+from collections.abc import Iterable
+from sqlalchemy import insert, update
+from sqlmodel import Session, col, select
+from app.models.chat_model import Chat, ChatChange, ChatChangeKind, ChatUser
+from app.models.user_model import User
+
+
+def bump_chat_version(session: Session, chat_id: uuid.UUID):
+    """Marca el detalle de un chat como modificado (sin cargar el objeto)"""
+    session.exec(
+        update(Chat)
+        .where(col(Chat.id) == chat_id)
+        .values(version=col(Chat.version) + 1)
+    )
+
+
+def bump_user_chats_version(session: Session, user_ids: Iterable[uuid.UUID]):
+    """Marca como modificada la lista de chats de varios usuarios en un solo UPDATE"""
+    user_ids = set(user_ids)
+    if not user_ids:
+        return
+    session.exec(
+        update(User)
+        .where(col(User.id).in_(user_ids))
+        .values(chats_version=col(User.chats_version) + 1)
+    )
+
+
+def bump_chat_members_chats_version(session: Session, chat_id: uuid.UUID):
+    """Marca como modificada la lista de chats de todos los miembros de un chat"""
+    session.exec(
+        update(User)
+        .where(
+            col(User.id).in_(
+                select(ChatUser.user_id).where(ChatUser.chat_id == chat_id)
+            )
+        )
+        .values(chats_version=col(User.chats_version) + 1)
+    )
+
+
+def record_chat_change(
+    session: Session,
+    chat_id: uuid.UUID,
+    kind: ChatChangeKind,
+    user_ids: Iterable[uuid.UUID] | None = None,
+):
+    """Añade entradas al registro de cambios usado por /sync.
+
+    Sin `user_ids` se registra un único cambio de todo el chat; con ellos, una
+    entrada por usuario añadido o eliminado, en un solo INSERT.
+    """
+    if user_ids is None:
+        rows = [{"chat_id": chat_id, "user_id": None, "kind": kind}]
+    else:
+        rows = [
+            {"chat_id": chat_id, "user_id": user_id, "kind": kind}
+            for user_id in user_ids
+        ]
+    if rows:
+        session.exec(insert(ChatChange), params=rows)
@@ -1,32 +1,179 @@
+import asyncio
+import time
+from collections.abc import AsyncIterator, Callable
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import Engine
+from sqlalchemy.orm import configure_mappers
 from starlette.middleware.trustedhost import TrustedHostMiddleware
+from app.core.env_config import EnvSettings, env
+from app.core.rate_limit import InMemoryRateLimitStore, WebSocketRateLimiter
+from app.core.tracing import TracingMiddleware, instrument_engine, tracer
+from app.db.archive import ensure_message_partitions, run_archiver
+from app.db.session import (
+    ReadYourWritesMiddleware,
+    ReplicaRouter,
+    create_db_engine,
+    create_replica_router,
+    warm_up_pool,
+)
+from app.routers.attachment_router import router as attachment_router
 from app.routers.auth_router import router as auth_router
 from app.routers.user_router import router as user_router
 from app.routers.chat_router import router as chat_router
+from app.routers.sync_router import router as sync_router
+from app.websockets.manager import ConnectionManager
+from app.websockets.receipts import ReceiptBuffer
 from app.websockets.websocket_router import router as websockets_router
 
 
-app = FastAPI(proxy_headers=True)
+async def _run_periodically(
+    interval: float, job: Callable[..., object], *args: object, blocking: bool = False
+):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            if blocking:
+                await run_in_threadpool(job, *args)
+            else:
+                job(*args)
+        except Exception as e:
+            print(f"Error in periodic job {job.__name__}: {e}")
 
-app.add_middleware(
-    TrustedHostMiddleware,
-    allowed_hosts=[
-        "*.ngrok-free.app",
-        "*.ngrok.io",
-        "localhost",
-        "127.0.0.1",
-        "*.onrender.com",
-        "*.railway.app",
-    ],
-)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    settings: EnvSettings = app.state.settings
+    engine: Engine = app.state.engine
+    replica_router: ReplicaRouter = app.state.replica_router
+    receipts: ReceiptBuffer = app.state.receipts
+    rate_limit_store = app.state.rate_limit_store
+    start = time.perf_counter()
+
+    # Todo lo que se construye de forma perezosa se hace antes de aceptar tráfico
+    configure_mappers()
+    app.openapi()
+    if settings.DB_POOL_WARM_CONNECTIONS > 0:
+        for pool_engine in (engine, *replica_router.replicas):
+            await run_in_threadpool(
+                warm_up_pool, pool_engine, settings.DB_POOL_WARM_CONNECTIONS
+            )
+
+    # Sin las particiones del mes los INSERT fallarían, pero no poder crearlas
+    # ahora (permisos, BD no disponible) no debe impedir el arranque
+    try:
+        await run_in_threadpool(ensure_message_partitions, engine)
+    except Exception as e:
+        print(f"Error creating message partitions: {e}")
+
+    receipts.start()
+    background_tasks = [
+        asyncio.create_task(
+            _run_periodically(
+                24 * 3600, ensure_message_partitions, engine, blocking=True
+            )
+        )
+    ]
+    if settings.ARCHIVE_INTERVAL_SECONDS > 0:
+        background_tasks.append(
+            asyncio.create_task(
+                _run_periodically(
+                    settings.ARCHIVE_INTERVAL_SECONDS,
+                    run_archiver,
+                    engine,
+                    blocking=True,
+                )
+            )
+        )
+    if isinstance(rate_limit_store, InMemoryRateLimitStore):
+        background_tasks.append(
+            asyncio.create_task(
+                _run_periodically(
+                    settings.RATE_LIMIT_PRUNE_SECONDS, rate_limit_store.prune
+                )
+            )
+        )
+
+    app.state.startup_seconds = time.perf_counter() - start
+    print(f"Startup completed in {app.state.startup_seconds * 1000:.1f} ms")
+
+    yield
+
+    # uvicorn cierra los /ws y espera a que sus endpoints vacíen la cola (en
+    # su `finally`) antes de llegar aquí; close_all solo cierra las que queden
+    # con servidores que no lo hacen. Después se escriben las confirmaciones
+    # pendientes y se cierra el pool
+    await app.state.manager.close_all(timeout=settings.WS_SHUTDOWN_TIMEOUT_SECONDS)
+    await receipts.close()
+    for task in background_tasks:
+        task.cancel()
+    for pool_engine in (engine, *replica_router.replicas):
+        pool_engine.dispose()
+
+
+def create_app(settings: EnvSettings = env) -> FastAPI:
+    """Construye la aplicación con sus middlewares, rutas y ciclo de vida.
+
+    El motor, las réplicas, el gestor de /ws, el buffer de confirmaciones y
+    los límites se crean aquí a partir de `settings` y quedan en `app.state`,
+    así que cada aplicación tiene los suyos. El tracer, los directorios de
+    adjuntos y archivo y lo que se lee al validar cada petición (clave de los
+    tokens, tamaños máximos, margen de /sync) siguen saliendo de `env`.
+    """
+    app = FastAPI(proxy_headers=True, lifespan=lifespan)
+
+    engine = create_db_engine(settings)
+    replica_router = create_replica_router(settings, engine)
+    manager = ConnectionManager(
+        settings.WS_BATCH_WINDOW_SECONDS, settings.WS_BATCH_MAX_EVENTS
+    )
+    rate_limit_store = InMemoryRateLimitStore()
+
+    app.state.settings = settings
+    app.state.engine = engine
+    app.state.replica_router = replica_router
+    app.state.manager = manager
+    app.state.receipts = ReceiptBuffer(engine, manager, settings.RECEIPTS_FLUSH_SECONDS)
+    app.state.rate_limit_store = rate_limit_store
+    app.state.ws_rate_limiter = WebSocketRateLimiter(rate_limit_store, settings)
+
+    app.add_middleware(
+        TrustedHostMiddleware,
+        allowed_hosts=[
+            "*.ngrok-free.app",
+            "*.ngrok.io",
+            "localhost",
+            "127.0.0.1",
+            "*.onrender.com",
+            "*.railway.app",
+        ],
+    )
+
+    if replica_router.replicas:
+        app.add_middleware(
+            ReadYourWritesMiddleware,
+            sticky_seconds=settings.READ_YOUR_WRITES_SECONDS,
+        )
+
+    if tracer.enabled:
+        for traced_engine in (engine, *replica_router.replicas):
+            instrument_engine(traced_engine)
+        app.add_middleware(TracingMiddleware)
+
+    app.include_router(auth_router)
+    app.include_router(user_router)
+    app.include_router(chat_router)
+    app.include_router(sync_router)
+    app.include_router(attachment_router)
+    app.include_router(websockets_router)
+
+    @app.get("/hello")
+    def hello():
+        return "Hello world"
 
-app.include_router(auth_router)
-app.include_router(user_router)
-app.include_router(chat_router)
-app.include_router(websockets_router)
+    return app
 
 
-@app.get("/hello")
-def hello():
-    return "Hello world"
+# Aplicación que sirve uvicorn (app.main:app)
+app = create_app()
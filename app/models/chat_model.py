@@ -2,6 +2,7 @@ from typing import TYPE_CHECKING
 import enum
 import uuid
 from datetime import datetime
+from sqlalchemy import Index
 from sqlmodel import SQLModel, Field, Relationship
 from .common_model import UserResponse
 
@@ -17,12 +18,19 @@ class ChatType(str, enum.Enum):
 class ChatUser(SQLModel, table=True):
     chat_id: uuid.UUID = Field(default=None, foreign_key="chat.id", primary_key=True)
     user_id: uuid.UUID = Field(default=None, foreign_key="user.id", primary_key=True)
+    # Marcas de agua de entrega/lectura: todos los mensajes con sent_at hasta
+    # este instante están entregados/leídos para este usuario
+    delivered_until: datetime | None = None
+    read_until: datetime | None = None
 
 
 class Message(SQLModel, table=True):
+    # (chat_id, sent_at, id) es el orden usado por la sincronización incremental
+    __table_args__ = (Index("ix_message_chat_id_sent_at", "chat_id", "sent_at", "id"),)
+
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     content: str
-    sent_at: datetime = Field(default_factory=datetime.now)
+    sent_at: datetime = Field(default_factory=datetime.now, index=True)
 
     # Relationships
     chat_id: uuid.UUID = Field(default=None, foreign_key="chat.id")
@@ -37,18 +45,72 @@ class Chat(SQLModel, table=True):
     type: ChatType = ChatType.DIRECT
     name: str
     created_at: datetime = Field(default_factory=datetime.now)
+    # Creador de un grupo: el único que puede eliminar a otros miembros
+    created_by: uuid.UUID | None = Field(default=None, foreign_key="user.id")
+    # Se incrementa con cada mensaje o cambio de miembros (ETag del detalle)
+    version: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
 
     # Relationships
     users: list["User"] = Relationship(back_populates="chats", link_model=ChatUser)
     messages: list["Message"] = Relationship(back_populates="chat")
 
 
+class ChatChangeKind(str, enum.Enum):
+    CHAT_CREATED = "chat_created"
+    MEMBER_ADDED = "member_added"
+    MEMBER_REMOVED = "member_removed"
+
+
+class ChatChange(SQLModel, table=True):
+    """Registro de cambios de chats y miembros, ordenado por un id creciente"""
+
+    __table_args__ = (
+        Index("ix_chatchange_chat_id_id", "chat_id", "id"),
+        Index("ix_chatchange_user_id_id", "user_id", "id"),
+    )
+
+    id: int | None = Field(default=None, primary_key=True)
+    chat_id: uuid.UUID = Field(foreign_key="chat.id")
+    # Usuario añadido o eliminado (None para cambios de todo el chat)
+    user_id: uuid.UUID | None = Field(default=None, foreign_key="user.id")
+    kind: ChatChangeKind
+    created_at: datetime = Field(default_factory=datetime.now)
+
+
+class Attachment(SQLModel, table=True):
+    """Metadatos de un fichero adjunto.
+
+    Los bytes no pasan por la base de datos: viven en el almacén por contenido
+    bajo su `sha256`, así que subidas idénticas comparten fichero.
+    """
+
+    id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
+    sha256: str = Field(max_length=64, index=True)
+    size: int
+    content_type: str
+    filename: str
+    chat_id: uuid.UUID = Field(foreign_key="chat.id", index=True)
+    uploader_id: uuid.UUID = Field(foreign_key="user.id")
+    # None hasta que se envía un mensaje que lo referencia. Sin clave foránea:
+    # el mensaje puede acabar archivado y `message` está particionada en Postgres
+    message_id: uuid.UUID | None = Field(default=None, index=True)
+    created_at: datetime = Field(default_factory=datetime.now)
+
+
 # Pydantic models for API responses
+class AttachmentResponse(SQLModel):
+    id: uuid.UUID
+    filename: str
+    content_type: str
+    size: int
+
+
 class MessageResponse(SQLModel):
     id: uuid.UUID
     content: str
     sent_at: datetime
     sender: "UserResponse"
+    attachments: list["AttachmentResponse"] = []
 
 
 class ChatResponse(SQLModel):
@@ -56,16 +118,62 @@ class ChatResponse(SQLModel):
     type: ChatType
     name: str
     created_at: datetime
+    created_by: uuid.UUID | None
     users: list["UserResponse"]
     messages: list["MessageResponse"]
 
 
+class MessagePageResponse(SQLModel):
+    messages: list["MessageResponse"]
+    cursor: str | None
+    has_more: bool
+
+
 class UserChatsResponse(SQLModel):
     id: uuid.UUID
     created_at: datetime
     users: list["UserResponse"]
 
 
+class GroupChatResponse(SQLModel):
+    id: uuid.UUID
+    type: ChatType
+    name: str
+    created_at: datetime
+    created_by: uuid.UUID | None
+    users: list["UserResponse"]
+
+
+class SyncMessageResponse(MessageResponse):
+    chat_id: uuid.UUID
+
+
+class SyncResponse(SQLModel):
+    chats: list["UserChatsResponse"]
+    removed_chat_ids: list[uuid.UUID]
+    messages: list["SyncMessageResponse"]
+    cursor: str
+    has_more: bool
+
+
+GROUP_MEMBERS_MAX_BATCH = 1000
+
+
+class NewGroupChatRequest(SQLModel):
+    name: str = Field(min_length=1, max_length=100)
+    member_ids: list[uuid.UUID] = Field(
+        default_factory=list, max_length=GROUP_MEMBERS_MAX_BATCH
+    )
+
+
+class GroupMembersRequest(SQLModel):
+    user_ids: list[uuid.UUID] = Field(min_length=1, max_length=GROUP_MEMBERS_MAX_BATCH)
+
+
 MessageResponse.model_rebuild()
 ChatResponse.model_rebuild()
+MessagePageResponse.model_rebuild()
 UserChatsResponse.model_rebuild()
+GroupChatResponse.model_rebuild()
+SyncMessageResponse.model_rebuild()
+SyncResponse.model_rebuild()
@@ -0,0 +1,75 @@
+"""Serializadores pre-construidos para las rutas de lectura más usadas.
+
+Las rutas rápidas seleccionan solo las columnas necesarias como tuplas y
+montan dicts con estas formas, que se serializan directamente a JSON con
+un TypeAdapter creado una sola vez al importar el módulo. Reflejan los
+modelos de respuesta de `chat_model` y `common_model`.
+"""
+
+import uuid
+from datetime import datetime
+from typing import TypedDict
+from pydantic import TypeAdapter
+from .chat_model import ChatType
+
+
+class UserPayload(TypedDict):
+    id: uuid.UUID
+    name: str
+    email: str
+
+
+class UserChatsPayload(TypedDict):
+    id: uuid.UUID
+    created_at: datetime
+    users: list[UserPayload]
+
+
+class AttachmentPayload(TypedDict):
+    id: uuid.UUID
+    filename: str
+    content_type: str
+    size: int
+
+
+class MessagePayload(TypedDict):
+    id: uuid.UUID
+    content: str
+    sent_at: datetime
+    sender: UserPayload
+    attachments: list[AttachmentPayload]
+
+
+class ChatPayload(TypedDict):
+    id: uuid.UUID
+    type: ChatType
+    name: str
+    created_at: datetime
+    users: list[UserPayload]
+    messages: list[MessagePayload]
+
+
+class MessagePagePayload(TypedDict):
+    messages: list[MessagePayload]
+    cursor: str | None
+    has_more: bool
+
+
+class SyncMessagePayload(MessagePayload):
+    chat_id: uuid.UUID
+
+
+class SyncPayload(TypedDict):
+    chats: list[UserChatsPayload]
+    removed_chat_ids: list[uuid.UUID]
+    messages: list[SyncMessagePayload]
+    cursor: str
+    has_more: bool
+
+
+user_serializer = TypeAdapter(UserPayload)
+users_serializer = TypeAdapter(list[UserPayload])
+user_chats_serializer = TypeAdapter(list[UserChatsPayload])
+chat_serializer = TypeAdapter(ChatPayload)
+message_page_serializer = TypeAdapter(MessagePagePayload)
+sync_serializer = TypeAdapter(SyncPayload)
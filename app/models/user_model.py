@@ -1,7 +1,8 @@
 from datetime import datetime
 import uuid
-from pydantic import BaseModel
-from sqlmodel import SQLModel, Field, Relationship
+from pydantic import BaseModel, Field as PydanticField
+from sqlalchemy import Index, func
+from sqlmodel import SQLModel, Field, Relationship, col
 from typing import TYPE_CHECKING
 from .chat_model import ChatUser
 
@@ -18,13 +19,42 @@ class UserBase(SQLModel):
 class User(UserBase, table=True):
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     created_at: datetime = Field(default_factory=datetime.now, nullable=False)
+    # Se incrementa cuando cambia la lista de chats del usuario (ETag de GET /chat/)
+    chats_version: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
 
     # Relationships
     chats: list["Chat"] = Relationship(back_populates="users", link_model=ChatUser)
     messages: list["Message"] = Relationship(back_populates="sender")
 
 
+# Índices funcionales para la búsqueda por prefijo sin distinguir mayúsculas.
+# text_pattern_ops permite que Postgres use el índice con `LIKE 'prefix%'`
+# independientemente de la collation de la base de datos.
+Index(
+    "ix_user_name_lower",
+    func.lower(col(User.name)).label("name_lower"),
+    postgresql_ops={"name_lower": "text_pattern_ops"},
+)
+Index(
+    "ix_user_email_lower",
+    func.lower(col(User.email)).label("email_lower"),
+    postgresql_ops={"email_lower": "text_pattern_ops"},
+)
+
+
 class UserCreate(BaseModel):
     name: str
     email: str
     password: str
+
+
+USERS_BATCH_MAX_SIZE = 100
+
+
+class UsersBatchRequest(BaseModel):
+    ids: list[uuid.UUID] = PydanticField(
+        default_factory=list, max_length=USERS_BATCH_MAX_SIZE
+    )
+    emails: list[str] = PydanticField(
+        default_factory=list, max_length=USERS_BATCH_MAX_SIZE
+    )
@@ -0,0 +1,183 @@
+import uuid
+from collections.abc import Collection
+from typing import Annotated
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import FileResponse
+from sqlmodel import Session, select, col
+from starlette.concurrency import run_in_threadpool
+from app.core.env_config import env
+from app.core.etag import etag_matches, immutable_headers, not_modified
+from app.core.storage import FileTooLarge, attachment_store
+from app.db.session import ReadSessionDep, SessionDep
+from app.models.chat_model import Attachment, AttachmentResponse, ChatUser
+from app.models.serializers import AttachmentPayload
+from .auth_router import TokenData, verify_token
+
+router = APIRouter(prefix="/attachments", tags=["Attachments"])
+
+# Tipos que el navegador puede mostrar sin ejecutar nada; el resto (html, svg,
+# xml...) se descarga siempre como fichero para que no corra en nuestro origen
+INLINE_CONTENT_TYPES = {
+    "image/png",
+    "image/jpeg",
+    "image/gif",
+    "image/webp",
+    "audio/mpeg",
+    "audio/ogg",
+    "audio/wav",
+    "video/mp4",
+    "video/webm",
+    "application/pdf",
+    "text/plain",
+}
+
+
+def load_message_attachments(
+    session: Session,
+    chat_id: uuid.UUID | None = None,
+    message_ids: Collection[uuid.UUID] | None = None,
+) -> dict[uuid.UUID, list[AttachmentPayload]]:
+    """Metadatos de los adjuntos de varios mensajes en una sola consulta,
+    filtrando por chat o por una lista de mensajes"""
+    statement = select(
+        col(Attachment.message_id),
+        col(Attachment.id),
+        col(Attachment.filename),
+        col(Attachment.content_type),
+        col(Attachment.size),
+    ).order_by(col(Attachment.created_at))
+    if chat_id is not None:
+        statement = statement.where(Attachment.chat_id == chat_id).where(
+            col(Attachment.message_id).is_not(None)
+        )
+    if message_ids is not None:
+        if not message_ids:
+            return {}
+        statement = statement.where(col(Attachment.message_id).in_(message_ids))
+
+    attachments: dict[uuid.UUID, list[AttachmentPayload]] = {}
+    for message_id, id, filename, content_type, size in session.exec(statement).all():
+        attachments.setdefault(message_id, []).append(
+            {"id": id, "filename": filename, "content_type": content_type, "size": size}
+        )
+    return attachments
+
+
+def _too_large() -> HTTPException:
+    return HTTPException(
+        status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        f"Attachments can't be larger than {env.ATTACHMENT_MAX_BYTES} bytes",
+    )
+
+
+@router.post(
+    "",
+    response_model=AttachmentResponse,
+    status_code=status.HTTP_201_CREATED,
+)
+async def upload_attachment(
+    request: Request,
+    session: SessionDep,
+    current_user: Annotated[TokenData, Depends(verify_token)],
+    chat_id: uuid.UUID,
+    filename: Annotated[str, Query(min_length=1, max_length=255)],
+):
+    """Sube un adjunto a un chat. El cuerpo es el contenido del fichero tal cual
+    (no multipart) y se escribe a disco por bloques a medida que llega.
+
+    El id devuelto se envía después en `send_message` (`content.attachment_ids`).
+    """
+    is_member = await run_in_threadpool(
+        lambda: session.exec(
+            select(ChatUser.chat_id)
+            .where(ChatUser.chat_id == chat_id)
+            .where(ChatUser.user_id == current_user.id)
+        ).first()
+    )
+    if is_member is None:
+        raise HTTPException(
+            status.HTTP_404_NOT_FOUND, f"Chat with id {str(chat_id)} not found"
+        )
+
+    # Se rechaza antes de leer el cuerpo si el cliente ya declara el tamaño
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit():
+        if int(content_length) > env.ATTACHMENT_MAX_BYTES:
+            raise _too_large()
+
+    try:
+        sha256, size = await attachment_store.save(
+            request.stream(), env.ATTACHMENT_MAX_BYTES
+        )
+    except FileTooLarge:
+        raise _too_large()
+
+    if size == 0:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, "Empty attachment")
+
+    attachment = Attachment(
+        sha256=sha256,
+        size=size,
+        content_type=request.headers.get("content-type", "application/octet-stream"),
+        # Solo el nombre, sin rutas del cliente
+        filename=filename.replace("\\", "/").rsplit("/", 1)[-1] or "file",
+        chat_id=chat_id,
+        uploader_id=current_user.id,
+    )
+
+    def save():
+        session.add(attachment)
+        session.commit()
+        session.refresh(attachment)
+
+    await run_in_threadpool(save)
+    return attachment
+
+
+@router.get("/{attachment_id}")
+def download_attachment(
+    attachment_id: uuid.UUID,
+    request: Request,
+    session: ReadSessionDep,
+    current_user: Annotated[TokenData, Depends(verify_token)],
+):
+    """Descarga un adjunto. Admite Range y, como el contenido de un id no cambia
+    nunca, se puede cachear indefinidamente."""
+    row = session.exec(
+        select(
+            col(Attachment.sha256),
+            col(Attachment.content_type),
+            col(Attachment.filename),
+        )
+        .join(ChatUser, col(ChatUser.chat_id) == col(Attachment.chat_id))
+        .where(Attachment.id == attachment_id)
+        .where(ChatUser.user_id == current_user.id)
+    ).first()
+    if row is None:
+        raise HTTPException(
+            status.HTTP_404_NOT_FOUND,
+            f"Attachment with id {str(attachment_id)} not found",
+        )
+
+    sha256, content_type, filename = row
+    # ETag fuerte: hace falta para que If-Range funcione con peticiones parciales
+    etag = f'"{sha256}"'
+    headers = {**immutable_headers(etag), "X-Content-Type-Options": "nosniff"}
+    if etag_matches(request, etag):
+        return not_modified(etag, headers)
+
+    path = attachment_store.path_for(sha256)
+    if not path.is_file():
+        raise HTTPException(status.HTTP_404_NOT_FOUND, "Attachment content not found")
+
+    # FileResponse envía el fichero por bloques (o con pathsend si el servidor
+    # lo soporta) y responde a Range con 206
+    return FileResponse(
+        path,
+        media_type=content_type,
+        filename=filename,
+        content_disposition_type="inline"
+        if content_type.split(";")[0].strip().lower() in INLINE_CONTENT_TYPES
+        else "attachment",
+        headers=headers,
+    )
@@ -1,6 +1,6 @@
 from typing import Annotated
 import uuid
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import (
     OAuth2PasswordBearer,
     OAuth2PasswordRequestForm,
@@ -16,6 +16,7 @@ from sqlmodel import select, Session
 from passlib.context import CryptContext
 from datetime import datetime, timedelta, timezone
 from app.core.env_config import env
+from app.core.rate_limit import check_auth_rate_limit, record_failed_login
 import jwt
 
 SECRET_KEY = env.SECRET_KEY
@@ -151,6 +152,7 @@ def authenticate_user(email: str, password: str, session: Session) -> User | Non
 @router.post("/token")
 async def login_for_access_token(
     *,
+    request: Request,
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
     session: Annotated[Session, Depends(get_session)],
 ) -> Token:
@@ -158,10 +160,14 @@ async def login_for_access_token(
     Endpoint para obtener un token de acceso usando email y password.
     Este ES el endpoint de login principal.
     """
+    # Se limita antes de verificar con bcrypt, que es la parte costosa
+    check_auth_rate_limit(request, form_data.username.lower())
+
     user = authenticate_user(
         email=form_data.username.lower(), password=form_data.password, session=session
     )
     if not user:
+        record_failed_login(request, form_data.username.lower())
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -177,8 +183,13 @@ async def login_for_access_token(
 
 @router.post("/register")
 def register(
-    *, user_create: UserCreate, session: Annotated[Session, Depends(get_session)]
+    *,
+    request: Request,
+    user_create: UserCreate,
+    session: Annotated[Session, Depends(get_session)],
 ):
+    check_auth_rate_limit(request)
+
     user_in_db = session.exec(
         select(User).where((User.email == user_create.email.lower()))
     ).first()
@@ -1,58 +1,129 @@
 from typing import Annotated
 from fastapi import (
     APIRouter,
+    BackgroundTasks,
     Depends,
     HTTPException,
+    Query,
+    Request,
     status,
 )
 from sqlmodel import Session, select, col
-from app.db.session import get_session
+from app.core.etag import etag_headers, etag_matches, make_etag, not_modified
+from app.core.responses import SerializedJSONResponse, serialized_response
+from app.db.archive import message_archive
+from app.db.session import (
+    ReadSessionDep,
+    ReplicaRouter,
+    get_replica_router,
+    get_session,
+)
+from app.db.versioning import (
+    bump_chat_members_chats_version,
+    bump_chat_version,
+    bump_user_chats_version,
+    record_chat_change,
+)
 from app.models.user_model import User
+from app.models.common_model import UserResponse
+from app.models.serializers import (
+    ChatPayload,
+    MessagePagePayload,
+    MessagePayload,
+    UserChatsPayload,
+    UserPayload,
+    chat_serializer,
+    message_page_serializer,
+    user_chats_serializer,
+)
+from app.websockets.manager import ConnectionManager, get_manager
+from .attachment_router import load_message_attachments
 from .auth_router import TokenData, verify_token
 from app.models.chat_model import (
     Chat,
+    ChatChangeKind,
     ChatUser,
     ChatType,
     ChatResponse,
+    GroupChatResponse,
+    GroupMembersRequest,
+    GROUP_MEMBERS_MAX_BATCH,
     Message,
+    MessagePageResponse,
+    NewGroupChatRequest,
     UserChatsResponse,
 )
-from sqlalchemy import func
-from sqlalchemy.orm import noload, selectinload
+from sqlalchemy import delete, func, insert, tuple_
 from pydantic import BaseModel
+from datetime import datetime
+import base64
+import json
 import uuid
 
 
 router = APIRouter(prefix="/chat")
 
+HISTORY_MAX_LIMIT = 100
+
 
 class NewDirectChatRequest(BaseModel):
     receiver_user_id: uuid.UUID
     message: str
 
 
-@router.get("/", response_model=list[UserChatsResponse])
+@router.get(
+    "/",
+    response_model=list[UserChatsResponse],
+    response_class=SerializedJSONResponse,
+)
 def get_user_chats(
-    session: Annotated[Session, Depends(get_session)],
+    request: Request,
+    session: ReadSessionDep,
     current_user: Annotated[TokenData, Depends(verify_token)],
 ):
     """Get all chats for a given user"""
 
-    statement = (
-        select(Chat)
-        .join(ChatUser)
-        .where(ChatUser.user_id == current_user.id)
-        .options(
-            selectinload(getattr(Chat, "users")), noload(getattr(Chat, "messages"))
-        )
-    )
+    # Si el cliente ya tiene la versión actual basta con una búsqueda por PK
+    chats_version = session.exec(
+        select(User.chats_version).where(User.id == current_user.id)
+    ).first()
+    headers = None
+    if chats_version is not None:
+        etag = make_etag(current_user.id, chats_version)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        headers = etag_headers(etag)
+
+    # Solo se seleccionan las columnas que se devuelven, como tuplas
+    user_chat_ids = select(ChatUser.chat_id).where(ChatUser.user_id == current_user.id)
 
-    user_chats = session.exec(statement).all()
+    chat_rows = session.exec(
+        select(col(Chat.id), col(Chat.created_at)).where(
+            col(Chat.id).in_(user_chat_ids)
+        )
+    ).all()
 
-    if not user_chats:
+    if not chat_rows:
         raise HTTPException(status.HTTP_404_NOT_FOUND, "Not found any chat")
 
-    return user_chats
+    member_rows = session.exec(
+        select(col(ChatUser.chat_id), col(User.id), col(User.name), col(User.email))
+        .join(User, col(User.id) == col(ChatUser.user_id))
+        .where(col(ChatUser.chat_id).in_(user_chat_ids))
+    ).all()
+
+    members: dict[uuid.UUID, list[UserPayload]] = {}
+    for chat_id, user_id, name, email in member_rows:
+        members.setdefault(chat_id, []).append(
+            {"id": user_id, "name": name, "email": email}
+        )
+
+    user_chats: list[UserChatsPayload] = [
+        {"id": chat_id, "created_at": created_at, "users": members.get(chat_id, [])}
+        for chat_id, created_at in chat_rows
+    ]
+
+    return serialized_response(user_chats_serializer, user_chats, headers)
 
 
 @router.post("/new", response_model=UserChatsResponse)
@@ -60,6 +131,7 @@ def create_new_chat(
     body: NewDirectChatRequest,
     current_user: Annotated[TokenData, Depends(verify_token)],
     session: Annotated[Session, Depends(get_session)],
+    replica_router: Annotated[ReplicaRouter, Depends(get_replica_router)],
 ):
     receiver_user = session.exec(
         select(User).where(User.id == body.receiver_user_id)
@@ -91,10 +163,12 @@ def create_new_chat(
     )
     session.add(chat)
 
-    current_user_in_chat = ChatUser(chat_id=chat.id, user_id=current_user.id)
-    session.add(current_user_in_chat)
-    receiver_user_in_chat = ChatUser(chat_id=chat.id, user_id=receiver_user.id)
-    session.add(receiver_user_in_chat)
+    session.add_all(
+        [
+            ChatUser(chat_id=chat.id, user_id=current_user.id),
+            ChatUser(chat_id=chat.id, user_id=receiver_user.id),
+        ]
+    )
 
     message_data = Message(
         chat_id=chat.id, sender_id=current_user.id, content=body.message
@@ -102,7 +176,11 @@ def create_new_chat(
 
     session.add(message_data)
 
+    bump_user_chats_version(session, [current_user.id, receiver_user.id])
+    record_chat_change(session, chat.id, ChatChangeKind.CHAT_CREATED)
+
     session.commit()
+    replica_router.mark_write(current_user.id)
 
     session.refresh(chat)
 
@@ -113,7 +191,7 @@ def create_new_chat(
 def get_chat_by_receiver_user_id(
     receiver_user_id: uuid.UUID,
     current_user: Annotated[TokenData, Depends(verify_token)],
-    session: Annotated[Session, Depends(get_session)],
+    session: ReadSessionDep,
 ):
     statement = (
         select(Chat)
@@ -129,23 +207,410 @@ def get_chat_by_receiver_user_id(
     return existing_chat
 
 
-@router.get("/{chat_id}", response_model=ChatResponse)
+@router.get(
+    "/{chat_id}",
+    response_model=ChatResponse,
+    response_class=SerializedJSONResponse,
+)
 def get_chat_by_id(
     chat_id: uuid.UUID,
-    session: Annotated[Session, Depends(get_session)],
+    request: Request,
+    session: ReadSessionDep,
     current_user: Annotated[TokenData, Depends(verify_token)],
 ):
-    statement = (
-        select(Chat)
+    # Comprueba la pertenencia y obtiene la versión en una consulta por PK
+    chat_row = session.exec(
+        select(col(Chat.version), col(Chat.type), col(Chat.name), col(Chat.created_at))
         .join(ChatUser)
         .where(Chat.id == chat_id)
         .where(ChatUser.user_id == current_user.id)
+    ).first()
+    if chat_row is None:
+        raise HTTPException(
+            status.HTTP_404_NOT_FOUND, f"Chat with id {str(chat_id)} not found"
+        )
+
+    version, chat_type, name, created_at = chat_row
+    etag = make_etag(chat_id, version)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    user_rows = session.exec(
+        select(col(User.id), col(User.name), col(User.email))
+        .join(ChatUser, col(ChatUser.user_id) == col(User.id))
+        .where(ChatUser.chat_id == chat_id)
+    ).all()
+
+    # Mensajes y remitentes en una sola consulta en lugar de cargas lazy por fila
+    message_rows = session.exec(
+        select(
+            col(Message.id),
+            col(Message.content),
+            col(Message.sent_at),
+            col(User.id),
+            col(User.name),
+            col(User.email),
+        )
+        .join(User, col(User.id) == col(Message.sender_id))
+        .where(Message.chat_id == chat_id)
+        .order_by(col(Message.sent_at))
+    ).all()
+    attachments = load_message_attachments(session, chat_id=chat_id)
+
+    chat: ChatPayload = {
+        "id": chat_id,
+        "type": chat_type,
+        "name": name,
+        "created_at": created_at,
+        "users": [
+            {"id": user_id, "name": user_name, "email": email}
+            for user_id, user_name, email in user_rows
+        ],
+        "messages": [
+            {
+                "id": message_id,
+                "content": content,
+                "sent_at": sent_at,
+                "sender": {"id": sender_id, "name": sender_name, "email": sender_email},
+                "attachments": attachments.get(message_id, []),
+            }
+            for message_id, content, sent_at, sender_id, sender_name, sender_email in message_rows
+        ],
+    }
+
+    return serialized_response(chat_serializer, chat, etag_headers(etag))
+
+
+def _encode_history_cursor(sent_at: datetime, message_id: uuid.UUID) -> str:
+    data = {"t": sent_at.isoformat(), "m": str(message_id)}
+    return base64.urlsafe_b64encode(json.dumps(data).encode()).decode()
+
+
+def _decode_history_cursor(cursor: str) -> tuple[datetime, uuid.UUID]:
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(data["t"]), uuid.UUID(data["m"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, "Invalid history cursor")
+
+
+@router.get(
+    "/{chat_id}/messages",
+    response_model=MessagePageResponse,
+    response_class=SerializedJSONResponse,
+)
+def get_chat_messages(
+    chat_id: uuid.UUID,
+    session: ReadSessionDep,
+    current_user: Annotated[TokenData, Depends(verify_token)],
+    before: str | None = None,
+    limit: Annotated[int, Query(ge=1, le=HISTORY_MAX_LIMIT)] = 50,
+):
+    """Historial del chat paginado hacia atrás, del mensaje más reciente al más
+    antiguo. Cuando se acaban los mensajes de la tabla sigue leyendo de los
+    segmentos archivados, así que el cliente no distingue unos de otros."""
+    is_member = session.exec(
+        select(ChatUser.chat_id)
+        .where(ChatUser.chat_id == chat_id)
+        .where(ChatUser.user_id == current_user.id)
+    ).first()
+    if is_member is None:
+        raise HTTPException(
+            status.HTTP_404_NOT_FOUND, f"Chat with id {str(chat_id)} not found"
+        )
+
+    cursor = _decode_history_cursor(before) if before else None
+
+    statement = (
+        select(
+            col(Message.id),
+            col(Message.content),
+            col(Message.sent_at),
+            col(User.id),
+            col(User.name),
+            col(User.email),
+        )
+        .join(User, col(User.id) == col(Message.sender_id))
+        .where(Message.chat_id == chat_id)
+        .order_by(col(Message.sent_at).desc(), col(Message.id).desc())
+        .limit(limit + 1)
     )
+    if cursor is not None:
+        statement = statement.where(
+            tuple_(col(Message.sent_at), col(Message.id)) < cursor
+        )
+    hot_rows = session.exec(statement).all()
+    attachments = load_message_attachments(
+        session, message_ids=[row[0] for row in hot_rows]
+    )
+
+    messages: list[MessagePayload] = [
+        {
+            "id": message_id,
+            "content": content,
+            "sent_at": sent_at,
+            "sender": {"id": sender_id, "name": sender_name, "email": sender_email},
+            "attachments": attachments.get(message_id, []),
+        }
+        for message_id, content, sent_at, sender_id, sender_name, sender_email in hot_rows
+    ]
 
-    chat = session.exec(statement).first()
+    # Lo que falta para completar la página está en el archivo, siempre antes
+    # que el mensaje más antiguo que sigue en la tabla
+    if len(messages) <= limit:
+        archive_before = (
+            (messages[-1]["sent_at"], messages[-1]["id"]) if messages else cursor
+        )
+        archived = message_archive.read_before(
+            chat_id, archive_before, limit + 1 - len(messages)
+        )
+        if archived:
+            sender_ids = {message["sender_id"] for message in archived}
+            senders: dict[uuid.UUID, UserPayload] = {
+                user_id: {"id": user_id, "name": name, "email": email}
+                for user_id, name, email in session.exec(
+                    select(col(User.id), col(User.name), col(User.email)).where(
+                        col(User.id).in_(sender_ids)
+                    )
+                ).all()
+            }
+            messages.extend(
+                {
+                    "id": message["id"],
+                    "content": message["content"],
+                    "sent_at": message["sent_at"],
+                    "sender": senders[message["sender_id"]],
+                    "attachments": message["attachments"],
+                }
+                for message in archived
+                if message["sender_id"] in senders
+            )
+
+    has_more = len(messages) > limit
+    messages = messages[:limit]
+    page: MessagePagePayload = {
+        "messages": messages,
+        "cursor": _encode_history_cursor(messages[-1]["sent_at"], messages[-1]["id"])
+        if has_more
+        else None,
+        "has_more": has_more,
+    }
+    return serialized_response(message_page_serializer, page)
+
+
+def _get_group_chat(
+    session: Session, chat_id: uuid.UUID, current_user: TokenData
+) -> Chat:
+    """Obtiene un chat de grupo del que el usuario actual es miembro"""
+    chat = session.exec(
+        select(Chat)
+        .join(ChatUser)
+        .where(Chat.id == chat_id)
+        .where(Chat.type == ChatType.GROUP)
+        .where(ChatUser.user_id == current_user.id)
+    ).first()
 
     if not chat:
         raise HTTPException(
-            status.HTTP_404_NOT_FOUND, f"Chat with id {str(chat_id)} not found"
+            status.HTTP_404_NOT_FOUND, f"Group chat with id {str(chat_id)} not found"
         )
     return chat
+
+
+def _get_existing_user_ids(
+    session: Session, user_ids: set[uuid.UUID]
+) -> set[uuid.UUID]:
+    """Devuelve cuáles de los ids existen, en una sola consulta IN"""
+    if not user_ids:
+        return set()
+    return set(session.exec(select(User.id).where(col(User.id).in_(user_ids))).all())
+
+
+def _group_chat_response(session: Session, chat: Chat) -> GroupChatResponse:
+    members = session.exec(
+        select(col(User.id), col(User.name), col(User.email))
+        .join(ChatUser, col(ChatUser.user_id) == col(User.id))
+        .where(ChatUser.chat_id == chat.id)
+    ).all()
+
+    return GroupChatResponse(
+        id=chat.id,
+        type=chat.type,
+        name=chat.name,
+        created_at=chat.created_at,
+        created_by=chat.created_by,
+        users=[
+            UserResponse(id=id, name=name, email=email) for id, name, email in members
+        ],
+    )
+
+
+@router.post("/group", response_model=GroupChatResponse)
+def create_group_chat(
+    body: NewGroupChatRequest,
+    background_tasks: BackgroundTasks,
+    current_user: Annotated[TokenData, Depends(verify_token)],
+    session: Annotated[Session, Depends(get_session)],
+    replica_router: Annotated[ReplicaRouter, Depends(get_replica_router)],
+    manager: Annotated[ConnectionManager, Depends(get_manager)],
+):
+    member_ids = set(body.member_ids)
+    member_ids.add(current_user.id)
+
+    existing_ids = _get_existing_user_ids(session, member_ids)
+    if existing_ids != member_ids:
+        raise HTTPException(
+            status.HTTP_404_NOT_FOUND,
+            f"Users not found: {', '.join(str(id) for id in member_ids - existing_ids)}",
+        )
+
+    chat = Chat(name=body.name, type=ChatType.GROUP, created_by=current_user.id)
+    session.add(chat)
+    session.flush()
+
+    # Un único INSERT de varias filas en lugar de un ChatUser por miembro
+    session.exec(
+        insert(ChatUser),
+        params=[{"chat_id": chat.id, "user_id": user_id} for user_id in member_ids],
+    )
+    bump_user_chats_version(session, member_ids)
+    record_chat_change(session, chat.id, ChatChangeKind.CHAT_CREATED)
+    session.commit()
+    replica_router.mark_write(current_user.id)
+    session.refresh(chat)
+
+    background_tasks.add_task(
+        manager.add_chat_members,
+        chat.id,
+        member_ids,
+        {
+            "type": "new_chat",
+            "chat_id": str(chat.id),
+            "sender_user": {
+                "id": str(current_user.id),
+                "name": current_user.name,
+                "email": current_user.email,
+            },
+        },
+    )
+
+    return _group_chat_response(session, chat)
+
+
+@router.post("/{chat_id}/members", response_model=GroupChatResponse)
+def add_group_members(
+    chat_id: uuid.UUID,
+    body: GroupMembersRequest,
+    background_tasks: BackgroundTasks,
+    current_user: Annotated[TokenData, Depends(verify_token)],
+    session: Annotated[Session, Depends(get_session)],
+    replica_router: Annotated[ReplicaRouter, Depends(get_replica_router)],
+    manager: Annotated[ConnectionManager, Depends(get_manager)],
+):
+    chat = _get_group_chat(session, chat_id, current_user)
+
+    requested_ids = set(body.user_ids)
+    existing_ids = _get_existing_user_ids(session, requested_ids)
+    if existing_ids != requested_ids:
+        raise HTTPException(
+            status.HTTP_404_NOT_FOUND,
+            f"Users not found: {', '.join(str(id) for id in requested_ids - existing_ids)}",
+        )
+
+    already_members = set(
+        session.exec(
+            select(ChatUser.user_id)
+            .where(ChatUser.chat_id == chat.id)
+            .where(col(ChatUser.user_id).in_(requested_ids))
+        ).all()
+    )
+    new_member_ids = requested_ids - already_members
+
+    if new_member_ids:
+        session.exec(
+            insert(ChatUser),
+            params=[
+                {"chat_id": chat.id, "user_id": user_id} for user_id in new_member_ids
+            ],
+        )
+        bump_chat_version(session, chat.id)
+        bump_chat_members_chats_version(session, chat.id)
+        record_chat_change(
+            session, chat.id, ChatChangeKind.MEMBER_ADDED, new_member_ids
+        )
+        session.commit()
+        replica_router.mark_write(current_user.id)
+
+        background_tasks.add_task(
+            manager.add_chat_members,
+            chat.id,
+            new_member_ids,
+            {
+                "type": "chat_members_added",
+                "chat_id": str(chat.id),
+                "user_ids": [str(user_id) for user_id in new_member_ids],
+                "added_by": str(current_user.id),
+            },
+        )
+
+    return _group_chat_response(session, chat)
+
+
+@router.delete("/{chat_id}/members", response_model=GroupChatResponse)
+def remove_group_members(
+    chat_id: uuid.UUID,
+    background_tasks: BackgroundTasks,
+    current_user: Annotated[TokenData, Depends(verify_token)],
+    session: Annotated[Session, Depends(get_session)],
+    replica_router: Annotated[ReplicaRouter, Depends(get_replica_router)],
+    manager: Annotated[ConnectionManager, Depends(get_manager)],
+    user_ids: Annotated[
+        list[uuid.UUID], Query(min_length=1, max_length=GROUP_MEMBERS_MAX_BATCH)
+    ],
+):
+    """Elimina miembros del grupo.
+
+    Cualquier miembro puede eliminarse a sí mismo para salir; solo el creador
+    del grupo puede eliminar a otros. Los grupos anteriores a `created_by` no
+    tienen creador, así que en ellos cada miembro solo puede salir.
+    """
+    chat = _get_group_chat(session, chat_id, current_user)
+    if chat.created_by != current_user.id and set(user_ids) != {current_user.id}:
+        raise HTTPException(
+            status.HTTP_403_FORBIDDEN,
+            "Only the group creator can remove other members",
+        )
+
+    # Solo cuentan las filas que se borraron de verdad: los ids que no son
+    # miembros no generan cambios ni notificaciones
+    removed_ids = set(
+        session.exec(
+            delete(ChatUser)
+            .where(col(ChatUser.chat_id) == chat.id)
+            .where(col(ChatUser.user_id).in_(set(user_ids)))
+            .returning(col(ChatUser.user_id))
+        ).scalars()
+    )
+    if not removed_ids:
+        return _group_chat_response(session, chat)
+
+    bump_chat_version(session, chat.id)
+    bump_chat_members_chats_version(session, chat.id)
+    bump_user_chats_version(session, removed_ids)
+    record_chat_change(session, chat.id, ChatChangeKind.MEMBER_REMOVED, removed_ids)
+    session.commit()
+    replica_router.mark_write(current_user.id)
+
+    background_tasks.add_task(
+        manager.remove_chat_members,
+        chat.id,
+        removed_ids,
+        {
+            "type": "chat_members_removed",
+            "chat_id": str(chat.id),
+            "user_ids": [str(user_id) for user_id in removed_ids],
+            "removed_by": str(current_user.id),
+        },
+    )
+
+    return _group_chat_response(session, chat)
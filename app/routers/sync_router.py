@@ -0,0 +1,273 @@
+import base64
+import json
+import uuid
+from datetime import datetime, timedelta
+from typing import Annotated, Any
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import or_, tuple_
+from sqlmodel import Session, col, select
+from app.core.env_config import env
+from app.core.responses import SerializedJSONResponse, serialized_response
+from app.db.session import ReadSessionDep
+from app.models.chat_model import (
+    Chat,
+    ChatChange,
+    ChatChangeKind,
+    ChatUser,
+    Message,
+    SyncResponse,
+)
+from app.models.serializers import (
+    SyncMessagePayload,
+    SyncPayload,
+    UserChatsPayload,
+    UserPayload,
+    sync_serializer,
+)
+from app.models.user_model import User
+from .attachment_router import load_message_attachments
+from .auth_router import TokenData, verify_token
+
+router = APIRouter(prefix="/sync", tags=["Sync"])
+
+SYNC_MAX_LIMIT = 1000
+
+Position = tuple[datetime, Any]
+
+
+class SyncCursor:
+    """Posición de un cliente en los dos flujos de /sync (cambios y mensajes).
+
+    `sent_at`/`created_at` y los ids se asignan antes del commit, así que una
+    fila puede hacerse visible después de otra con una posición mayor. Por eso
+    cada flujo solo avanza hasta `SYNC_SAFETY_WINDOW_SECONDS` antes de ahora:
+    lo anterior ya hizo commit, y el cursor es un keyset estricto (hora, id)
+    que nunca vuelve atrás.
+    """
+
+    def __init__(self, changes: Position | None, messages: Position | None):
+        self.changes = changes
+        self.messages = messages
+
+    def encode(self) -> str:
+        data = {
+            "c": _dump_position(self.changes),
+            "m": _dump_position(self.messages),
+        }
+        return base64.urlsafe_b64encode(json.dumps(data).encode()).decode()
+
+    @classmethod
+    def decode(cls, cursor: str) -> "SyncCursor":
+        try:
+            data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            changes = data["c"]
+            messages = data["m"]
+            return cls(
+                (datetime.fromisoformat(changes[0]), int(changes[1]))
+                if changes
+                else None,
+                (datetime.fromisoformat(messages[0]), uuid.UUID(messages[1]))
+                if messages
+                else None,
+            )
+        except (ValueError, KeyError, TypeError, IndexError):
+            raise HTTPException(status.HTTP_400_BAD_REQUEST, "Invalid sync cursor")
+
+
+def _dump_position(position: Position | None) -> list[str] | None:
+    if position is None:
+        return None
+    return [position[0].isoformat(), str(position[1])]
+
+
+def _settled_before() -> datetime:
+    """Las filas anteriores a este instante ya son todas visibles"""
+    return datetime.now() - timedelta(seconds=env.SYNC_SAFETY_WINDOW_SECONDS)
+
+
+def _after(
+    statement, time_column, id_column, position: Position | None, settled: datetime
+):
+    """Filas estrictamente posteriores a `position` y anteriores a `settled`"""
+    statement = statement.where(time_column <= settled)
+    if position is not None:
+        statement = statement.where(tuple_(time_column, id_column) > position)
+    return statement
+
+
+def _current_position(
+    session: Session, time_column, id_column, settled: datetime
+) -> Position | None:
+    row = session.exec(
+        _after(select(time_column, id_column), time_column, id_column, None, settled)
+        .order_by(time_column.desc(), id_column.desc())
+        .limit(1)
+    ).first()
+    return tuple(row) if row else None
+
+
+@router.get("", response_model=SyncResponse, response_class=SerializedJSONResponse)
+def sync(
+    session: ReadSessionDep,
+    current_user: Annotated[TokenData, Depends(verify_token)],
+    since: str | None = None,
+    limit: Annotated[int, Query(ge=1, le=SYNC_MAX_LIMIT)] = 500,
+):
+    """Devuelve lo que ha cambiado desde `since`: chats nuevos o con cambios de
+    miembros, chats de los que el usuario salió y mensajes nuevos.
+
+    Sin `since` solo devuelve el cursor actual: el cliente lo pide antes de
+    descargar el estado completo con GET /chat/ y luego sincroniza desde él.
+    Si `has_more` es true hay que volver a llamar con el nuevo cursor. Los
+    mensajes anteriores al cursor de un chat al que el usuario se acaba de
+    unir no se incluyen; se obtienen con GET /chat/{chat_id}.
+
+    Lo de los últimos `SYNC_SAFETY_WINDOW_SECONDS` llega en la siguiente
+    llamada (en tiempo real ya llega por /ws). Por lo mismo, la primera
+    sincronización tras el cursor inicial puede repetir mensajes recientes que
+    ya trajo GET /chat/: el cliente debe ignorar los ids que ya tenga.
+    """
+    settled = _settled_before()
+    if since is None:
+        cursor = SyncCursor(
+            _current_position(
+                session, col(ChatChange.created_at), col(ChatChange.id), settled
+            ),
+            _current_position(session, col(Message.sent_at), col(Message.id), settled),
+        )
+        payload: SyncPayload = {
+            "chats": [],
+            "removed_chat_ids": [],
+            "messages": [],
+            "cursor": cursor.encode(),
+            "has_more": False,
+        }
+        return serialized_response(sync_serializer, payload)
+
+    cursor = SyncCursor.decode(since)
+    user_chat_ids = select(ChatUser.chat_id).where(ChatUser.user_id == current_user.id)
+
+    # Cambios de chats y miembros en orden (created_at, id)
+    change_statement = (
+        select(
+            col(ChatChange.id),
+            col(ChatChange.chat_id),
+            col(ChatChange.user_id),
+            col(ChatChange.kind),
+            col(ChatChange.created_at),
+        )
+        .where(
+            or_(
+                col(ChatChange.chat_id).in_(user_chat_ids),
+                col(ChatChange.user_id) == current_user.id,
+            )
+        )
+        .order_by(col(ChatChange.created_at), col(ChatChange.id))
+        .limit(limit + 1)
+    )
+    change_statement = _after(
+        change_statement,
+        col(ChatChange.created_at),
+        col(ChatChange.id),
+        cursor.changes,
+        settled,
+    )
+    change_rows = session.exec(change_statement).all()
+    has_more = len(change_rows) > limit
+    change_rows = change_rows[:limit]
+
+    # Mensajes en orden (sent_at, id) a partir del cursor
+    message_statement = (
+        select(
+            col(Message.id),
+            col(Message.content),
+            col(Message.sent_at),
+            col(Message.chat_id),
+            col(User.id),
+            col(User.name),
+            col(User.email),
+        )
+        .join(User, col(User.id) == col(Message.sender_id))
+        .where(col(Message.chat_id).in_(user_chat_ids))
+        .order_by(col(Message.sent_at), col(Message.id))
+        .limit(limit + 1)
+    )
+    message_statement = _after(
+        message_statement,
+        col(Message.sent_at),
+        col(Message.id),
+        cursor.messages,
+        settled,
+    )
+    message_rows = session.exec(message_statement).all()
+    has_more = has_more or len(message_rows) > limit
+    message_rows = message_rows[:limit]
+
+    changed_chat_ids = {chat_id for _, chat_id, _, _, _ in change_rows}
+    current_chat_ids = (
+        set(
+            session.exec(
+                select(ChatUser.chat_id)
+                .where(ChatUser.user_id == current_user.id)
+                .where(col(ChatUser.chat_id).in_(changed_chat_ids))
+            ).all()
+        )
+        if changed_chat_ids
+        else set()
+    )
+    removed_chat_ids = {
+        chat_id
+        for _, chat_id, user_id, kind, _ in change_rows
+        if kind == ChatChangeKind.MEMBER_REMOVED
+        and user_id == current_user.id
+        and chat_id not in current_chat_ids
+    }
+
+    chats: list[UserChatsPayload] = []
+    if current_chat_ids:
+        members: dict[uuid.UUID, list[UserPayload]] = {}
+        for chat_id, user_id, name, email in session.exec(
+            select(col(ChatUser.chat_id), col(User.id), col(User.name), col(User.email))
+            .join(User, col(User.id) == col(ChatUser.user_id))
+            .where(col(ChatUser.chat_id).in_(current_chat_ids))
+        ).all():
+            members.setdefault(chat_id, []).append(
+                {"id": user_id, "name": name, "email": email}
+            )
+        chats = [
+            {"id": chat_id, "created_at": created_at, "users": members.get(chat_id, [])}
+            for chat_id, created_at in session.exec(
+                select(col(Chat.id), col(Chat.created_at)).where(
+                    col(Chat.id).in_(current_chat_ids)
+                )
+            ).all()
+        ]
+
+    attachments = load_message_attachments(
+        session, message_ids=[row[0] for row in message_rows]
+    )
+    messages: list[SyncMessagePayload] = [
+        {
+            "id": id,
+            "chat_id": chat_id,
+            "content": content,
+            "sent_at": message_sent_at,
+            "sender": {"id": sender_id, "name": sender_name, "email": sender_email},
+            "attachments": attachments.get(id, []),
+        }
+        for id, content, message_sent_at, chat_id, sender_id, sender_name, sender_email in message_rows
+    ]
+
+    if change_rows:
+        cursor.changes = (change_rows[-1][4], change_rows[-1][0])
+    if message_rows:
+        cursor.messages = (message_rows[-1][2], message_rows[-1][0])
+
+    payload = {
+        "chats": chats,
+        "removed_chat_ids": sorted(removed_chat_ids),
+        "messages": messages,
+        "cursor": cursor.encode(),
+        "has_more": has_more,
+    }
+    return serialized_response(sync_serializer, payload)
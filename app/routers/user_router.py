@@ -1,18 +1,105 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from app.db.session import get_session
-from sqlmodel import Session, select
-from app.models.user_model import User
+import uuid
+from collections.abc import Sequence
+from typing import Annotated
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from app.db.session import ReadSessionDep
+from sqlalchemy import func, or_
+from sqlmodel import select, col
+from app.models.user_model import User, UsersBatchRequest
 from app.models.common_model import UserResponse
+from app.models.serializers import UserPayload, user_serializer, users_serializer
+from app.core.responses import SerializedJSONResponse, serialized_response
+from .auth_router import TokenData, verify_token
 
 router = APIRouter(prefix="/users", tags=["Users"])
 
+SEARCH_MAX_LIMIT = 50
+# Un prefijo más corto recorre demasiado de los índices
+SEARCH_MIN_PREFIX = 3
 
-@router.get("", response_model=UserResponse)
-async def get_user_by_email(email: str, session: Session = Depends(get_session)):
-    user = session.exec(select(User).where(User.email == email)).first()
-    if not user:
+
+def _user_payloads(rows: Sequence[tuple[uuid.UUID, str, str]]) -> list[UserPayload]:
+    return [{"id": id, "name": name, "email": email} for id, name, email in rows]
+
+
+@router.get("", response_model=UserResponse, response_class=SerializedJSONResponse)
+def get_user_by_email(email: str, session: ReadSessionDep):
+    row = session.exec(
+        select(col(User.id), col(User.name), col(User.email)).where(User.email == email)
+    ).first()
+    if not row:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"User with email {email} not found",
         )
-    return user
+    return serialized_response(user_serializer, _user_payloads([row])[0])
+
+
+@router.post(
+    "/batch",
+    response_model=list[UserResponse],
+    response_class=SerializedJSONResponse,
+)
+def get_users_batch(
+    body: UsersBatchRequest,
+    session: ReadSessionDep,
+    current_user: Annotated[TokenData, Depends(verify_token)],
+):
+    """Resuelve varios usuarios por id y/o email en una sola consulta"""
+    if not body.ids and not body.emails:
+        return serialized_response(users_serializer, [])
+
+    conditions = []
+    if body.ids:
+        conditions.append(col(User.id).in_(set(body.ids)))
+    if body.emails:
+        conditions.append(col(User.email).in_({email.lower() for email in body.emails}))
+
+    statement = select(col(User.id), col(User.name), col(User.email)).where(
+        or_(*conditions)
+    )
+
+    return serialized_response(
+        users_serializer, _user_payloads(session.exec(statement).all())
+    )
+
+
+@router.get(
+    "/search",
+    response_model=list[UserResponse],
+    response_class=SerializedJSONResponse,
+)
+def search_users(
+    session: ReadSessionDep,
+    current_user: Annotated[TokenData, Depends(verify_token)],
+    prefix: Annotated[str, Query(min_length=SEARCH_MIN_PREFIX, max_length=100)],
+    limit: Annotated[int, Query(ge=1, le=SEARCH_MAX_LIMIT)] = 20,
+):
+    """Busca usuarios cuyo nombre o email empieza por `prefix` (sin distinguir mayúsculas).
+
+    Primero van los que coinciden por nombre y después los que coinciden por
+    email. Cada búsqueda es una consulta aparte para que use su propio índice
+    lower(...), ordenado y con LIMIT, en vez de un OR que no puede usar ninguno.
+    """
+    # Se escapan los comodines para que el prefijo se trate de forma literal
+    escaped = (
+        prefix.lower().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    )
+    pattern = f"{escaped}%"
+
+    users: dict[uuid.UUID, tuple[uuid.UUID, str, str]] = {}
+    for column in (col(User.name), col(User.email)):
+        if len(users) >= limit:
+            break
+        statement = (
+            select(col(User.id), col(User.name), col(User.email))
+            .where(func.lower(column).like(pattern, escape="\\"))
+            .order_by(func.lower(column))
+            .limit(limit)
+        )
+        for row in session.exec(statement).all():
+            users.setdefault(row[0], tuple(row))
+
+    return serialized_response(
+        users_serializer, _user_payloads(list(users.values())[:limit])
+    )
@@ -0,0 +1,80 @@
+import asyncio
+from collections.abc import Callable
+from typing import Any
+from fastapi import WebSocket
+from app.websockets.codecs import Codec
+
+
+class OutboundBatcher:
+    """Agrupa los eventos salientes de una conexión en frames `batch`.
+
+    El primer evento tras un periodo de calma se envía en el acto. Los que
+    llegan durante la ventana siguiente se acumulan y se envían juntos al
+    cerrarse la ventana (o antes, al llegar a `max_events`) como
+    `{"type": "batch", "events": [...]}`. Si solo hay uno pendiente se envía
+    tal cual. Los envíos nunca se solapan, así que se mantiene el orden.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        codec: Codec,
+        window: float,
+        max_events: int,
+        on_error: Callable[[], None],
+    ):
+        self.websocket = websocket
+        self.codec = codec
+        self.window = window
+        self.max_events = max_events
+        self.on_error = on_error
+        self.pending: list[dict[str, Any]] = []
+        self._window_open = False
+        self._full = asyncio.Event()
+        self._task: asyncio.Task[None] | None = None
+
+    async def send(self, message: dict[str, Any]):
+        self.pending.append(message)
+        if self._window_open:
+            if len(self.pending) >= self.max_events:
+                self._full.set()
+            return
+
+        # Evento aislado: se envía ya y se abre la ventana de agrupación
+        self._window_open = True
+        try:
+            await self._flush()
+        except Exception:
+            self._window_open = False
+            raise
+        self._task = asyncio.create_task(self._run_window())
+
+    async def _flush(self):
+        events, self.pending = self.pending, []
+        if not events:
+            return
+        message = events[0] if len(events) == 1 else {"type": "batch", "events": events}
+        await self.codec.send(self.websocket, self.codec.encode(message))
+
+    async def _run_window(self):
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(self._full.wait(), timeout=self.window)
+                except TimeoutError:
+                    pass
+                self._full.clear()
+                if not self.pending:
+                    return
+                await self._flush()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.on_error()
+        finally:
+            self._window_open = False
+
+    def close(self):
+        if self._task is not None:
+            self._task.cancel()
+        self.pending.clear()
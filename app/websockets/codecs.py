@@ -0,0 +1,66 @@
+import json
+from typing import Any
+from fastapi import WebSocket
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+
+class JsonCodec:
+    """Codificación por defecto: frames de texto JSON"""
+
+    subprotocol = "chat.json"
+
+    def encode(self, message: Any) -> str:
+        return json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+
+    def decode(self, payload: str | bytes) -> Any:
+        return json.loads(payload)
+
+    async def send(self, websocket: WebSocket, payload: str | bytes):
+        await websocket.send_text(payload)  # type: ignore
+
+
+class MsgpackCodec:
+    """Frames binarios MessagePack (mismos mensajes, sin repetir texto JSON)"""
+
+    subprotocol = "chat.msgpack"
+
+    def encode(self, message: Any) -> bytes:
+        return msgpack.packb(message)  # type: ignore
+
+    def decode(self, payload: str | bytes) -> Any:
+        # Un cliente msgpack puede seguir enviando frames de texto JSON
+        if isinstance(payload, str):
+            return json.loads(payload)
+        return msgpack.unpackb(payload)  # type: ignore
+
+    async def send(self, websocket: WebSocket, payload: str | bytes):
+        await websocket.send_bytes(payload)  # type: ignore
+
+
+Codec = JsonCodec | MsgpackCodec
+
+json_codec = JsonCodec()
+
+# Codecs disponibles por subprotocolo (Sec-WebSocket-Protocol)
+codecs: dict[str, Codec] = {json_codec.subprotocol: json_codec}
+if msgpack is not None:
+    codecs[MsgpackCodec.subprotocol] = MsgpackCodec()
+
+
+def negotiate_codec(websocket: WebSocket) -> tuple[Codec, str | None]:
+    """Elige el primer subprotocolo ofrecido por el cliente que soportamos.
+
+    Devuelve el codec y el subprotocolo a aceptar (None si el cliente no pidió
+    ninguno conocido, en cuyo caso se usa JSON como hasta ahora). La
+    compresión permessage-deflate la negocia el servidor ASGI (uvicorn) a
+    partir de Sec-WebSocket-Extensions y se aplica sobre cualquier codec.
+    """
+    for subprotocol in websocket.scope.get("subprotocols", []):
+        codec = codecs.get(subprotocol)
+        if codec is not None:
+            return codec, subprotocol
+    return json_codec, None
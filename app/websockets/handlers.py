@@ -0,0 +1,296 @@
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from typing import Any
+import uuid
+from datetime import datetime
+from fastapi import WebSocket
+from pydantic import BaseModel
+from sqlalchemy import Engine
+from sqlmodel import Session, col, select
+from starlette.concurrency import run_in_threadpool
+
+from app.core.rate_limit import WebSocketRateLimiter
+from app.db.session import ReplicaRouter
+from app.db.versioning import bump_chat_version
+from app.models.chat_model import Attachment, ChatUser, Message
+from app.routers.auth_router import TokenData
+from app.websockets.manager import ConnectionManager
+from app.websockets.receipts import ReceiptBuffer
+from app.websockets.schemas import (
+    AckDeliveredMessage,
+    MarkReadMessage,
+    NewChatMessage,
+    SendMessageMessage,
+    SubscribeChatMessage,
+    TypingMessage,
+    UnsubscribeChatMessage,
+)
+
+
+@dataclass
+class ConnectionContext:
+    """Estado de una conexión /ws que reciben todos los handlers"""
+
+    websocket: WebSocket
+    user: TokenData
+    session: Session
+
+    @property
+    def user_id(self) -> uuid.UUID:
+        return self.user.id
+
+    # Servicios de la aplicación que atiende la conexión (ver create_app)
+
+    @property
+    def engine(self) -> Engine:
+        return self.websocket.app.state.engine
+
+    @property
+    def replica_router(self) -> ReplicaRouter:
+        return self.websocket.app.state.replica_router
+
+    @property
+    def manager(self) -> ConnectionManager:
+        return self.websocket.app.state.manager
+
+    @property
+    def receipts(self) -> ReceiptBuffer:
+        return self.websocket.app.state.receipts
+
+    @property
+    def rate_limiter(self) -> WebSocketRateLimiter:
+        return self.websocket.app.state.ws_rate_limiter
+
+
+@dataclass
+class HandlerSpec:
+    schema: type[BaseModel]
+    handler: Callable[[ConnectionContext, Any], Awaitable[None]]
+    # inline=True: se atiende en el bucle de lectura (frames baratos).
+    # inline=False: se encola en la cola de trabajo de la conexión (persistencia).
+    inline: bool
+
+
+# Registro de handlers: dict[type, HandlerSpec]
+handlers: dict[str, HandlerSpec] = {}
+
+
+def handler(message_type: str, schema: type[BaseModel], *, inline: bool = True):
+    """Registra un handler para un `type` de mensaje del cliente"""
+
+    def decorator(fn: Callable[[ConnectionContext, Any], Awaitable[None]]):
+        handlers[message_type] = HandlerSpec(schema=schema, handler=fn, inline=inline)
+        return fn
+
+    return decorator
+
+
+def _is_member(session: Session, chat_id: uuid.UUID, user_id: uuid.UUID) -> bool:
+    return (
+        session.exec(
+            select(ChatUser.user_id)
+            .where(ChatUser.chat_id == chat_id)
+            .where(ChatUser.user_id == user_id)
+        ).first()
+        is not None
+    )
+
+
+def _check_membership(engine: Engine, chat_id: uuid.UUID, user_id: uuid.UUID) -> bool:
+    # Sesión propia: la de la conexión la usa a la vez el worker de la cola
+    with Session(engine) as session:
+        return _is_member(session, chat_id, user_id)
+
+
+async def _send_not_a_member(
+    ctx: ConnectionContext, message_type: str, chat_id: uuid.UUID
+):
+    await ctx.manager.send_to_connection(
+        ctx.websocket,
+        {
+            "type": "error",
+            "code": "not_a_member",
+            "message_type": message_type,
+            "chat_id": str(chat_id),
+        },
+    )
+
+
+@handler("subscribe_chat", SubscribeChatMessage)
+async def subscribe_chat(ctx: ConnectionContext, message: SubscribeChatMessage):
+    # Suscribirse da acceso a todo lo que se difunde en el chat
+    if not await run_in_threadpool(
+        _check_membership, ctx.engine, message.chat_id, ctx.user_id
+    ):
+        await _send_not_a_member(ctx, message.type, message.chat_id)
+        return
+    await ctx.manager.subscribe_to_chat(ctx.user_id, message.chat_id)
+    # Enviar usuarios online en el chat
+    online_users = ctx.manager.get_online_users_in_chat(message.chat_id)
+    await ctx.manager.send_to_user(
+        ctx.user_id,
+        {
+            "type": "chat_online_users",
+            "chat_id": str(message.chat_id),
+            "online_users": [str(u) for u in online_users],
+        },
+    )
+
+
+@handler("unsubscribe_chat", UnsubscribeChatMessage)
+async def unsubscribe_chat(ctx: ConnectionContext, message: UnsubscribeChatMessage):
+    await ctx.manager.unsubscribe_from_chat(ctx.user_id, message.chat_id)
+
+
+@handler("typing", TypingMessage)
+async def typing(ctx: ConnectionContext, message: TypingMessage):
+    # Solo quien está suscrito (y por tanto es miembro) puede avisar en el chat
+    if message.chat_id not in ctx.manager.user_chat_subscriptions.get(ctx.user_id, ()):
+        return
+    await ctx.manager.broadcast_to_chat(
+        message.chat_id,
+        {
+            "type": "typing",
+            "chat_id": str(message.chat_id),
+            "user_id": str(ctx.user_id),
+        },
+        exclude_user=ctx.user_id,
+    )
+
+
+@handler("new_chat", NewChatMessage)
+async def new_chat(ctx: ConnectionContext, message: NewChatMessage):
+    # Enviar notificación al usuario receptor con información del remitente
+    await ctx.manager.send_to_user(
+        user_id=message.receiver_user.id,
+        message={
+            "type": "new_chat",
+            "chat_id": str(message.chat_id),
+            "sender_user": {  # Información del usuario que creó el chat
+                "id": str(ctx.user_id),
+                "name": ctx.user.name,
+                "email": ctx.user.email,
+            },
+        },
+    )
+
+
+def _save_message(
+    session: Session, message: Message, attachment_ids: list[uuid.UUID]
+) -> tuple[Message, list[dict[str, str | int]]] | str:
+    """Guarda el mensaje y le asocia sus adjuntos.
+
+    Sin guardar nada, devuelve el código de error "invalid_attachments" si
+    algún adjunto no existe, no es del remitente, es de otro chat o ya
+    pertenece a otro mensaje, y "not_a_member" si el remitente no es miembro.
+    """
+    attachments: list[Attachment] = []
+    if attachment_ids:
+        attachments = list(
+            session.exec(
+                select(Attachment)
+                .where(col(Attachment.id).in_(attachment_ids))
+                .where(Attachment.chat_id == message.chat_id)
+                .where(Attachment.uploader_id == message.sender_id)
+                .where(col(Attachment.message_id).is_(None))
+            ).all()
+        )
+        if len(attachments) != len(set(attachment_ids)):
+            return "invalid_attachments"
+
+    # El UPDATE de la versión bloquea la fila del chat hasta el commit, igual
+    # que al eliminar miembros: la comprobación no se cruza con una baja
+    bump_chat_version(session, message.chat_id)
+    if not _is_member(session, message.chat_id, message.sender_id):
+        session.rollback()
+        return "not_a_member"
+
+    # La hora se fija justo antes del commit para que /sync la vea casi en
+    # orden de commit (lo que quede lo cubre SYNC_SAFETY_WINDOW_SECONDS)
+    message.sent_at = datetime.now()
+    session.add(message)
+    for attachment in attachments:
+        attachment.message_id = message.id
+    session.add_all(attachments)
+    session.commit()
+    session.refresh(message)
+
+    return message, [
+        {
+            "id": str(attachment.id),
+            "filename": attachment.filename,
+            "content_type": attachment.content_type,
+            "size": attachment.size,
+        }
+        for attachment in attachments
+    ]
+
+
+@handler("send_message", SendMessageMessage, inline=False)
+async def send_message(ctx: ConnectionContext, message: SendMessageMessage):
+    # El commit es bloqueante: se hace en un hilo para no parar el event loop
+    result = await run_in_threadpool(
+        _save_message,
+        ctx.session,
+        Message(
+            content=message.content.message,
+            chat_id=message.chat_id,
+            sender_id=ctx.user_id,
+        ),
+        message.content.attachment_ids,
+    )
+    if isinstance(result, str):
+        await ctx.manager.send_to_connection(
+            ctx.websocket,
+            {
+                "type": "error",
+                "code": result,
+                "message_type": message.type,
+                "chat_id": str(message.chat_id),
+            },
+        )
+        return
+    saved, attachments = result
+    ctx.replica_router.mark_write(ctx.user_id)
+
+    # Broadcast del mensaje a otros usuarios en el chat
+    await ctx.manager.broadcast_to_chat(
+        message.chat_id,
+        {
+            "type": "new_message",
+            "message_id": str(saved.id),
+            "chat_id": str(message.chat_id),
+            "sender": {
+                "id": str(ctx.user_id),
+                "name": ctx.user.name,
+                "email": ctx.user.email,
+            },
+            "content": {
+                "message": message.content.message,
+                "created_at": str(saved.sent_at),
+                "attachments": attachments,
+            },
+        },
+        exclude_user=ctx.user_id,
+    )
+
+
+@handler("ack_delivered", AckDeliveredMessage)
+async def ack_delivered(ctx: ConnectionContext, message: AckDeliveredMessage):
+    # Solo se actualiza la marca en memoria; se escribe en el siguiente flush
+    ctx.receipts.record(
+        message.chat_id,
+        ctx.user_id,
+        message.message_id,
+        read=False,
+    )
+
+
+@handler("mark_read", MarkReadMessage)
+async def mark_read(ctx: ConnectionContext, message: MarkReadMessage):
+    ctx.receipts.record(
+        message.chat_id,
+        ctx.user_id,
+        message.message_id,
+        read=True,
+    )
@@ -1,19 +1,52 @@
+import asyncio
 import uuid
+from collections.abc import Iterable
+from typing import Any
 from fastapi import WebSocket
+from starlette.requests import HTTPConnection
+from app.websockets.batching import OutboundBatcher
+from app.websockets.codecs import Codec, json_codec
 
 
 class ConnectionManager:
-    def __init__(self):
+    def __init__(self, batch_window: float, batch_max_events: int):
+        # Ventana y tamaño máximo de los lotes de las conexiones con batch=true
+        self.batch_window = batch_window
+        self.batch_max_events = batch_max_events
         # Conexiones activas por usuario: dict[user_id, list[websocket]]
         self.user_connections: dict[uuid.UUID, list[WebSocket]] = {}
+        # Codec negociado por cada conexión: dict[websocket, codec]
+        self.connection_codecs: dict[WebSocket, Codec] = {}
+        # Conexiones que pidieron agrupar los frames salientes
+        self.connection_batchers: dict[WebSocket, OutboundBatcher] = {}
         # Mapeo de que chats esta "escuchando" cada usuario: dict[user_id, set[chat_id]]
         self.user_chat_subscriptions: dict[uuid.UUID, set[uuid.UUID]] = {}
         # Mapeo inverso: que usuario estan en cada chat: dict[chat_id, set[user_id]]
         self.chat_participants: dict[uuid.UUID, set[uuid.UUID]] = {}
+        # Snapshot inmutable de chat_participants usado por los broadcasts. Se
+        # invalida en cada cambio y se reconstruye una sola vez en el siguiente
+        # mensaje, así no se copia el set de participantes por cada mensaje.
+        self._participants_snapshot: dict[uuid.UUID, tuple[uuid.UUID, ...]] = {}
 
-    async def connect_user(self, user_id: uuid.UUID, websocket: WebSocket):
+    async def connect_user(
+        self,
+        user_id: uuid.UUID,
+        websocket: WebSocket,
+        codec: Codec = json_codec,
+        subprotocol: str | None = None,
+        batch: bool = False,
+    ):
         """Conecta un usuario y acepta el WebSocket"""
-        await websocket.accept()
+        await websocket.accept(subprotocol=subprotocol)
+        self.connection_codecs[websocket] = codec
+        if batch:
+            self.connection_batchers[websocket] = OutboundBatcher(
+                websocket,
+                codec,
+                window=self.batch_window,
+                max_events=self.batch_max_events,
+                on_error=lambda: self.disconnect_user(user_id, websocket),
+            )
 
         if user_id not in self.user_connections:
             self.user_connections[user_id] = []
@@ -24,6 +57,10 @@ class ConnectionManager:
 
     def disconnect_user(self, user_id: uuid.UUID, websocket: WebSocket):
         """Desconecta un usuario especifico"""
+        self.connection_codecs.pop(websocket, None)
+        batcher = self.connection_batchers.pop(websocket, None)
+        if batcher is not None:
+            batcher.close()
         if user_id in self.user_connections:
             if websocket in self.user_connections[user_id]:
                 self.user_connections[user_id].remove(websocket)
@@ -35,6 +72,7 @@ class ConnectionManager:
                     for chat_id in self.user_chat_subscriptions[user_id]:
                         if chat_id in self.chat_participants:
                             self.chat_participants[chat_id].discard(user_id)
+                            self._participants_snapshot.pop(chat_id, None)
                     del self.user_chat_subscriptions[user_id]
 
     async def subscribe_to_chat(self, user_id: uuid.UUID, chat_id: uuid.UUID):
@@ -46,6 +84,7 @@ class ConnectionManager:
         if chat_id not in self.chat_participants:
             self.chat_participants[chat_id] = set()
         self.chat_participants[chat_id].add(user_id)
+        self._participants_snapshot.pop(chat_id, None)
 
     async def unsubscribe_from_chat(self, user_id: uuid.UUID, chat_id: uuid.UUID):
         """Desuscribe a un usuario a un chat"""
@@ -54,21 +93,103 @@ class ConnectionManager:
 
         if chat_id in self.chat_participants:
             self.chat_participants[chat_id].discard(user_id)
+            self._participants_snapshot.pop(chat_id, None)
+
+    async def add_chat_members(
+        self,
+        chat_id: uuid.UUID,
+        user_ids: Iterable[uuid.UUID],
+        message: dict[str, str | list[str] | dict[str, str]] | None = None,
+    ):
+        """Suscribe al chat a los nuevos miembros online y notifica a todo el chat"""
+        online = [user_id for user_id in user_ids if user_id in self.user_connections]
+        if online:
+            self.chat_participants.setdefault(chat_id, set()).update(online)
+            self._participants_snapshot.pop(chat_id, None)
+            for user_id in online:
+                self.user_chat_subscriptions.setdefault(user_id, set()).add(chat_id)
+
+        if message is not None:
+            await self.broadcast_to_chat(chat_id, message)
+
+    async def remove_chat_members(
+        self,
+        chat_id: uuid.UUID,
+        user_ids: Iterable[uuid.UUID],
+        message: dict[str, str | list[str] | dict[str, str]] | None = None,
+    ):
+        """Notifica a todo el chat (incluidos los eliminados) y los desuscribe"""
+        if message is not None:
+            await self.broadcast_to_chat(chat_id, message)
+
+        removed = set(user_ids)
+        participants = self.chat_participants.get(chat_id)
+        if participants is not None:
+            participants.difference_update(removed)
+            self._participants_snapshot.pop(chat_id, None)
+        for user_id in removed:
+            if user_id in self.user_chat_subscriptions:
+                self.user_chat_subscriptions[user_id].discard(chat_id)
 
     async def send_to_user(
         self, user_id: uuid.UUID, message: dict[str, str | list[str] | dict[str, str]]
     ):
         """Envía un mensaje a todas las conexiones de un usuario"""
         if user_id in self.user_connections:
-            disconnected = []
-            for connection in self.user_connections[user_id]:
+            await self._send_encoded(user_id, message, {})
+
+    async def send_to_connection(self, websocket: WebSocket, message: dict[str, Any]):
+        """Envía un mensaje a una sola conexión con su codec"""
+        batcher = self.connection_batchers.get(websocket)
+        if batcher is not None:
+            await batcher.send(message)
+            return
+        codec = self.connection_codecs.get(websocket, json_codec)
+        await codec.send(websocket, codec.encode(message))
+
+    async def _send_encoded(
+        self,
+        user_id: uuid.UUID,
+        message: dict[str, Any],
+        encoded: dict[Codec, str | bytes],
+    ):
+        """Envía un mensaje a todas las conexiones de un usuario.
+
+        `encoded` guarda el mensaje ya codificado por codec, de modo que en un
+        broadcast cada codec serializa el mensaje una sola vez.
+        """
+        connections = self.user_connections.get(user_id)
+        if not connections:
+            return
+
+        disconnected = []
+        for connection in connections:
+            batcher = self.connection_batchers.get(connection)
+            if batcher is not None:
                 try:
-                    await connection.send_json(message)
+                    await batcher.send(message)
                 except Exception:
                     disconnected.append(connection)
+                continue
 
-            for connection in disconnected:
-                self.disconnect_user(user_id, connection)
+            codec = self.connection_codecs.get(connection, json_codec)
+            payload = encoded.get(codec)
+            if payload is None:
+                payload = encoded[codec] = codec.encode(message)
+            try:
+                await codec.send(connection, payload)
+            except Exception:
+                disconnected.append(connection)
+
+        for connection in disconnected:
+            self.disconnect_user(user_id, connection)
+
+    def _get_participants(self, chat_id: uuid.UUID) -> tuple[uuid.UUID, ...]:
+        snapshot = self._participants_snapshot.get(chat_id)
+        if snapshot is None:
+            snapshot = tuple(self.chat_participants.get(chat_id, ()))
+            self._participants_snapshot[chat_id] = snapshot
+        return snapshot
 
     async def broadcast_to_chat(
         self,
@@ -77,15 +198,19 @@ class ConnectionManager:
         exclude_user: uuid.UUID | None = None,
     ):
         """Envía un mensaje a todos los usuarios suscritos a un chat"""
-        if chat_id in self.chat_participants:
-            for user_id in self.chat_participants[chat_id]:
-                if exclude_user is None or user_id != exclude_user:
-                    await self.send_to_user(user_id, message)
+        if chat_id not in self.chat_participants:
+            return
+
+        # Se serializa una sola vez por codec y broadcast, no por destinatario
+        encoded: dict[Codec, str | bytes] = {}
+        for user_id in self._get_participants(chat_id):
+            if user_id != exclude_user:
+                await self._send_encoded(user_id, message, encoded)
 
     async def notify_user_status(self, user_id: uuid.UUID, status: str):
         """Notifica cambios de estado de usuario a sus chats activos"""
         if user_id in self.user_chat_subscriptions:
-            for chat_id in self.user_chat_subscriptions[user_id]:
+            for chat_id in tuple(self.user_chat_subscriptions[user_id]):
                 await self.broadcast_to_chat(
                     chat_id,
                     {
@@ -97,6 +222,29 @@ class ConnectionManager:
                     exclude_user=user_id,
                 )
 
+    async def close_all(self, code: int = 1001, timeout: float = 5.0):
+        """Cierra las conexiones que queden y espera a que sus bucles terminen.
+
+        Cada endpoint /ws recibe el disconnect, vacía su cola de trabajo en su
+        `finally` y se desconecta del manager. uvicorn ya cierra los /ws y
+        espera a sus endpoints antes del shutdown del lifespan, así que ahí
+        normalmente no queda ninguna; esto cubre a los servidores que no lo
+        hacen.
+        """
+        for websocket in [
+            websocket
+            for connections in self.user_connections.values()
+            for websocket in connections
+        ]:
+            try:
+                await websocket.close(code=code)
+            except Exception:
+                pass
+
+        deadline = asyncio.get_running_loop().time() + timeout
+        while self.user_connections and asyncio.get_running_loop().time() < deadline:
+            await asyncio.sleep(0.05)
+
     def get_online_users_in_chat(self, chat_id: uuid.UUID) -> list[uuid.UUID]:
         """Obtiene lista de usuarios online en un chat"""
         if chat_id not in self.chat_participants:
@@ -108,3 +256,7 @@ class ConnectionManager:
                 online_users.append(user_id)
 
         return online_users
+
+
+def get_manager(connection: HTTPConnection) -> ConnectionManager:
+    return connection.app.state.manager
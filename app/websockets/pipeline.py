@@ -0,0 +1,96 @@
+import asyncio
+from typing import Any
+from pydantic import BaseModel, ValidationError
+
+from app.core.tracing import tracer
+from app.websockets.handlers import ConnectionContext, HandlerSpec, handlers
+
+
+class ConnectionPipeline:
+    """Separa la lectura de frames de su procesamiento para una conexión.
+
+    Los frames baratos (typing, subscribe...) se atienden en línea. Los que
+    tocan la base de datos se encolan en una cola acotada que consume un único
+    worker, de modo que el bucle de lectura nunca espera a un commit y los
+    mensajes de cada chat se procesan en el orden en que llegaron.
+    """
+
+    def __init__(self, ctx: ConnectionContext, queue_size: int):
+        self.ctx = ctx
+        self.queue: asyncio.Queue[tuple[HandlerSpec, BaseModel] | None] = asyncio.Queue(
+            maxsize=queue_size
+        )
+        self.worker = asyncio.create_task(self._run_worker())
+
+    async def send_error(self, code: str, data: dict[str, Any], **extra: Any):
+        await self.ctx.manager.send_to_connection(
+            self.ctx.websocket,
+            {
+                "type": "error",
+                "code": code,
+                "message_type": data.get("type"),
+                "chat_id": data.get("chat_id"),
+                **extra,
+            },
+        )
+
+    async def dispatch(self, data: Any):
+        """Valida un frame y lo atiende en línea o lo encola"""
+        if not isinstance(data, dict):
+            await self.send_error("invalid_message", {})
+            return
+
+        message_type = data.get("type")
+        spec = handlers.get(message_type) if isinstance(message_type, str) else None
+        if spec is None:
+            return
+
+        retry_after = self.ctx.rate_limiter.check(self.ctx.user_id, message_type)
+        if retry_after:
+            await self.send_error(
+                "rate_limited", data, retry_after=round(retry_after, 3)
+            )
+            return
+
+        try:
+            message = spec.schema.model_validate(data)
+        except ValidationError:
+            await self.send_error("invalid_message", data)
+            return
+
+        if spec.inline:
+            await self._handle(spec, message, data)
+            return
+
+        try:
+            self.queue.put_nowait((spec, message))
+        except asyncio.QueueFull:
+            await self.send_error("overloaded", data)
+
+    async def _run_worker(self):
+        while True:
+            item = await self.queue.get()
+            if item is None:
+                return
+            spec, message = item
+            await self._handle(spec, message, message.model_dump(mode="json"))
+
+    async def _handle(
+        self, spec: HandlerSpec, message: BaseModel, data: dict[str, Any]
+    ):
+        """Ejecuta un handler; un fallo se responde con un error, sin cerrar el /ws"""
+        try:
+            with tracer.span("ws", data.get("type", "")):
+                await spec.handler(self.ctx, message)
+        except Exception as e:
+            print(f"Error handling {type(message).__name__}: {e}")
+            self.ctx.session.rollback()
+            try:
+                await self.send_error("internal_error", data)
+            except Exception:
+                pass
+
+    async def close(self):
+        """Procesa lo que queda en la cola y detiene el worker"""
+        await self.queue.put(None)
+        await self.worker
@@ -0,0 +1,232 @@
+import asyncio
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime
+from sqlalchemy import DateTime, Engine, bindparam, case, update
+from sqlmodel import Session, col, select
+from starlette.concurrency import run_in_threadpool
+
+from app.models.chat_model import ChatUser, Message
+from app.websockets.manager import ConnectionManager
+
+
+@dataclass
+class Watermark:
+    delivered_until: datetime | None = None
+    delivered_message_id: uuid.UUID | None = None
+    read_until: datetime | None = None
+    read_message_id: uuid.UUID | None = None
+
+
+# Ids distintos que se guardan por (chat, usuario) entre dos flush
+PENDING_IDS_MAX = 64
+
+
+@dataclass
+class PendingReceipts:
+    # Ids en orden de llegada (dict como conjunto ordenado)
+    delivered: dict[uuid.UUID, None] = field(default_factory=dict)
+    read: dict[uuid.UUID, None] = field(default_factory=dict)
+
+
+def _remember(ids: dict[uuid.UUID, None], message_id: uuid.UUID):
+    """Añade el id como el más reciente; si no cabe se olvida el más antiguo,
+    que es el que menos probabilidades tiene de fijar la marca de agua"""
+    ids.pop(message_id, None)
+    if len(ids) >= PENDING_IDS_MAX:
+        del ids[next(iter(ids))]
+    ids[message_id] = None
+
+
+def _advance(column, param: str):
+    """Solo avanza la marca de agua, nunca la hace retroceder"""
+    value = bindparam(param, type_=DateTime)
+    return case(
+        (col(column).is_(None), value),
+        (col(column) < value, value),
+        else_=col(column),
+    )
+
+
+# Un único UPDATE ejecutado como executemany para todas las marcas pendientes
+_update_watermarks = (
+    update(ChatUser)
+    .where(col(ChatUser.chat_id) == bindparam("b_chat_id"))
+    .where(col(ChatUser.user_id) == bindparam("b_user_id"))
+    .values(
+        delivered_until=_advance(ChatUser.delivered_until, "b_delivered_until"),
+        read_until=_advance(ChatUser.read_until, "b_read_until"),
+    )
+)
+
+
+class ReceiptBuffer:
+    """Acumula en memoria las confirmaciones de entrega y lectura.
+
+    Cada `ack_delivered`/`mark_read` solo guarda el id del mensaje pendiente
+    de su (chat, usuario). Cada `flush_seconds` se busca el `sent_at` de esos
+    mensajes en la base de datos (comprobando que son del chat y que el usuario
+    es miembro), se escriben todas las marcas con un único UPDATE y se difunde
+    un solo evento `receipt` por (chat, usuario) con la última marca, así que
+    el coste por usuario y por intervalo es constante sin importar cuántos
+    mensajes haya leído.
+    """
+
+    def __init__(
+        self, engine: Engine, manager: ConnectionManager, flush_seconds: float
+    ):
+        self.engine = engine
+        self.manager = manager
+        self.flush_seconds = flush_seconds
+        self.pending: dict[tuple[uuid.UUID, uuid.UUID], PendingReceipts] = {}
+        # Últimas marcas escritas, para ignorar confirmaciones que no avanzan
+        self.flushed: dict[tuple[uuid.UUID, uuid.UUID], Watermark] = {}
+        self._task: asyncio.Task[None] | None = None
+
+    def record(
+        self,
+        chat_id: uuid.UUID,
+        user_id: uuid.UUID,
+        message_id: uuid.UUID,
+        read: bool,
+    ):
+        receipts = self.pending.setdefault((chat_id, user_id), PendingReceipts())
+        # Leer un mensaje implica que también se ha entregado
+        for ids in (
+            (receipts.delivered, receipts.read) if read else (receipts.delivered,)
+        ):
+            _remember(ids, message_id)
+        self.start()
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Error flushing receipts: {e}")
+
+    async def flush(self):
+        if not self.pending:
+            return
+        pending, self.pending = self.pending, {}
+
+        watermarks = await run_in_threadpool(self._write, pending)
+
+        if len(self.flushed) > 100_000:
+            self.flushed.clear()
+        self.flushed.update(watermarks)
+
+        for (chat_id, user_id), watermark in watermarks.items():
+            await self.manager.broadcast_to_chat(
+                chat_id,
+                {
+                    "type": "receipt",
+                    "chat_id": str(chat_id),
+                    "user_id": str(user_id),
+                    "delivered_until": _isoformat(watermark.delivered_until),
+                    "delivered_message_id": _str(watermark.delivered_message_id),
+                    "read_until": _isoformat(watermark.read_until),
+                    "read_message_id": _str(watermark.read_message_id),
+                },
+                exclude_user=user_id,
+            )
+
+    def _resolve(
+        self,
+        session: Session,
+        pending: dict[tuple[uuid.UUID, uuid.UUID], PendingReceipts],
+    ) -> dict[tuple[uuid.UUID, uuid.UUID], Watermark]:
+        """Marcas que avanzan, con el `sent_at` guardado de cada mensaje.
+
+        Los ids de otro chat, de chats de los que el usuario no es miembro o
+        de mensajes que no existen se ignoran.
+        """
+        message_ids = {
+            message_id
+            for receipts in pending.values()
+            for message_id in receipts.delivered
+        }
+        user_ids = {user_id for _, user_id in pending}
+        sent_at: dict[tuple[uuid.UUID, uuid.UUID, uuid.UUID], datetime] = {
+            (chat_id, user_id, message_id): message_sent_at
+            for message_id, chat_id, user_id, message_sent_at in session.exec(
+                select(
+                    col(Message.id),
+                    col(Message.chat_id),
+                    col(ChatUser.user_id),
+                    col(Message.sent_at),
+                )
+                .join(ChatUser, col(ChatUser.chat_id) == col(Message.chat_id))
+                .where(col(Message.id).in_(message_ids))
+                .where(col(ChatUser.user_id).in_(user_ids))
+            ).all()
+        }
+
+        watermarks: dict[tuple[uuid.UUID, uuid.UUID], Watermark] = {}
+        for key, receipts in pending.items():
+            flushed = self.flushed.get(key)
+            watermark = Watermark(**vars(flushed)) if flushed else Watermark()
+            changed = False
+            for message_id in receipts.delivered:
+                message_sent_at = sent_at.get((*key, message_id))
+                if message_sent_at is None:
+                    continue
+                if (
+                    watermark.delivered_until is None
+                    or message_sent_at > watermark.delivered_until
+                ):
+                    watermark.delivered_until = message_sent_at
+                    watermark.delivered_message_id = message_id
+                    changed = True
+                if message_id in receipts.read and (
+                    watermark.read_until is None
+                    or message_sent_at > watermark.read_until
+                ):
+                    watermark.read_until = message_sent_at
+                    watermark.read_message_id = message_id
+                    changed = True
+            if changed:
+                watermarks[key] = watermark
+        return watermarks
+
+    def _write(
+        self, pending: dict[tuple[uuid.UUID, uuid.UUID], PendingReceipts]
+    ) -> dict[tuple[uuid.UUID, uuid.UUID], Watermark]:
+        with Session(self.engine) as session:
+            watermarks = self._resolve(session, pending)
+            if not watermarks:
+                return watermarks
+            session.connection().execute(
+                _update_watermarks,
+                [
+                    {
+                        "b_chat_id": chat_id,
+                        "b_user_id": user_id,
+                        "b_delivered_until": watermark.delivered_until,
+                        "b_read_until": watermark.read_until,
+                    }
+                    for (chat_id, user_id), watermark in watermarks.items()
+                ],
+            )
+            session.commit()
+        return watermarks
+
+    async def close(self):
+        """Detiene el flush periódico y escribe lo pendiente"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+
+def _isoformat(value: datetime | None) -> str | None:
+    return str(value) if value is not None else None
+
+
+def _str(value: uuid.UUID | None) -> str | None:
+    return str(value) if value is not None else None
@@ -0,0 +1,53 @@
+import uuid
+from typing import Literal
+from pydantic import BaseModel, Field
+from app.core.env_config import env
+
+
+# Mensajes que el cliente envía por /ws. Todos llevan `type` y `chat_id`.
+class ClientMessage(BaseModel):
+    chat_id: uuid.UUID
+
+
+class SubscribeChatMessage(ClientMessage):
+    type: Literal["subscribe_chat"]
+
+
+class UnsubscribeChatMessage(ClientMessage):
+    type: Literal["unsubscribe_chat"]
+
+
+class TypingMessage(ClientMessage):
+    type: Literal["typing"]
+
+
+class ReceiverUser(BaseModel):
+    id: uuid.UUID
+
+
+class NewChatMessage(ClientMessage):
+    type: Literal["new_chat"]
+    receiver_user: ReceiverUser
+
+
+class MessageContent(BaseModel):
+    message: str
+    # Ids devueltos por POST /attachments; solo viajan metadatos, nunca bytes
+    attachment_ids: list[uuid.UUID] = Field(
+        default_factory=list, max_length=env.MESSAGE_MAX_ATTACHMENTS
+    )
+
+
+class SendMessageMessage(ClientMessage):
+    type: Literal["send_message"]
+    content: MessageContent
+
+
+class AckDeliveredMessage(ClientMessage):
+    type: Literal["ack_delivered"]
+    message_id: uuid.UUID
+
+
+class MarkReadMessage(ClientMessage):
+    type: Literal["mark_read"]
+    message_id: uuid.UUID
@@ -0,0 +1,33 @@
+"""Tiempo y bytes de GET /chat/ y GET /chat/{id} con y sin If-None-Match"""
+
+from benchmarks.common import create_client, report, seed_user_with_chats, timeit
+
+ITERATIONS = 200
+
+
+def bench_endpoint(client, name: str, url: str, headers: dict[str, str]):
+    full = client.get(url, headers=headers)
+    etag = full.headers["etag"]
+    conditional_headers = {**headers, "If-None-Match": etag}
+    assert client.get(url, headers=conditional_headers).status_code == 304
+
+    report(f"{name} 200", timeit(lambda: client.get(url, headers=headers), ITERATIONS))
+    report(
+        f"{name} 304",
+        timeit(lambda: client.get(url, headers=conditional_headers), ITERATIONS),
+    )
+    print(f"{name} body bytes: 200={len(full.content)} 304=0")
+
+
+def main():
+    client = create_client()
+    _, headers = seed_user_with_chats(chats=100, messages_per_chat=20)
+
+    bench_endpoint(client, "GET /chat/", "/chat/", headers)
+
+    chat_id = client.get("/chat/", headers=headers).json()[0]["id"]
+    bench_endpoint(client, "GET /chat/{id}", f"/chat/{chat_id}", headers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Tiempo de entrega de un mensaje en salas de 10, 1.000 y 10.000 miembros online"""
+
+import asyncio
+import time
+import uuid
+from benchmarks.common import report
+from app.core.env_config import env
+from app.websockets.manager import ConnectionManager
+
+ROOM_SIZES = (10, 1_000, 10_000)
+
+
+class FakeWebSocket:
+    """WebSocket en memoria que solo cuenta lo que se le envía"""
+
+    def __init__(self):
+        self.frames = 0
+        self.bytes_sent = 0
+
+    async def accept(self, subprotocol: str | None = None):
+        pass
+
+    async def send_text(self, data: str):
+        self.frames += 1
+        self.bytes_sent += len(data)
+
+    async def send_bytes(self, data: bytes):
+        self.frames += 1
+        self.bytes_sent += len(data)
+
+
+async def bench_room(size: int, iterations: int):
+    manager = ConnectionManager(env.WS_BATCH_WINDOW_SECONDS, env.WS_BATCH_MAX_EVENTS)
+    chat_id = uuid.uuid4()
+    user_ids = [uuid.uuid4() for _ in range(size)]
+
+    for user_id in user_ids:
+        await manager.connect_user(user_id, FakeWebSocket())  # type: ignore
+    await manager.add_chat_members(chat_id, user_ids)
+
+    sender = user_ids[0]
+    message = {
+        "type": "new_message",
+        "message_id": str(uuid.uuid4()),
+        "chat_id": str(chat_id),
+        "sender": {"id": str(sender), "name": "Sender", "email": "sender@x.com"},
+        "content": {"message": "hola a todos", "created_at": "2026-01-01 00:00:00"},
+    }
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        await manager.broadcast_to_chat(chat_id, message, exclude_user=sender)  # type: ignore
+    elapsed = (time.perf_counter() - start) / iterations
+
+    report(f"broadcast to {size} online members", elapsed)
+    report(f"  per recipient ({size})", elapsed / size)
+
+
+async def main():
+    for size in ROOM_SIZES:
+        await bench_room(size, iterations=max(10, 100_000 // size))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,90 @@
+"""GET /chat/ para un usuario con 500 chats: ruta ORM anterior vs proyección por columnas"""
+
+import time
+import tracemalloc
+from benchmarks.common import (
+    app_engine,
+    create_client,
+    report,
+    seed_user_with_chats,
+    timeit,
+)
+from pydantic import TypeAdapter
+from sqlalchemy.orm import noload, selectinload
+from sqlmodel import Session, select
+from starlette.requests import Request
+from app.models.chat_model import Chat, ChatUser, UserChatsResponse
+from app.routers.auth_router import TokenData
+from app.routers.chat_router import get_user_chats
+
+CHATS = 500
+ITERATIONS = 50
+
+legacy_serializer = TypeAdapter(list[UserChatsResponse])
+
+
+def legacy_orm_path(session: Session, current_user: TokenData) -> bytes:
+    """Implementación anterior: objetos ORM + validación con los modelos de respuesta"""
+    statement = (
+        select(Chat)
+        .join(ChatUser)
+        .where(ChatUser.user_id == current_user.id)
+        .options(
+            selectinload(getattr(Chat, "users")), noload(getattr(Chat, "messages"))
+        )
+    )
+    user_chats = session.exec(statement).all()
+    validated = legacy_serializer.validate_python(user_chats, from_attributes=True)
+    return legacy_serializer.dump_json(validated)
+
+
+def projection_path(session: Session, current_user: TokenData) -> bytes:
+    request = Request({"type": "http", "headers": []})
+    return bytes(get_user_chats(request, session, current_user).body)
+
+
+def allocations_per_call(fn, iterations: int = 10) -> float:
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for _ in range(iterations):
+        fn()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocated = sum(stat.count_diff for stat in after.compare_to(before, "filename"))
+    return allocated / iterations
+
+
+def main():
+    client = create_client()
+    user_id, headers = seed_user_with_chats(chats=CHATS)
+    current_user = TokenData(id=user_id, email="bench@bench.com", name="Bench")
+    engine = app_engine()
+
+    for name, path in (
+        ("legacy ORM", legacy_orm_path),
+        ("projection", projection_path),
+    ):
+        # Sesión nueva en cada llamada para no medir el identity map caliente
+        def run():
+            with Session(engine) as session:
+                return path(session, current_user)
+
+        run()
+        report(f"{name}: time per call", timeit(run, ITERATIONS))
+        print(f"{name}: net allocated blocks per call: {allocations_per_call(run):.0f}")
+
+        tracemalloc.start()
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{name}: peak traced memory per call: {peak / 1024:.0f} KiB")
+
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        client.get("/chat/", headers=headers)
+    elapsed = time.perf_counter() - start
+    print(f"GET /chat/ over HTTP: {ITERATIONS / elapsed:.1f} req/s")
+
+
+if __name__ == "__main__":
+    main()
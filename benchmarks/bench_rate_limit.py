@@ -0,0 +1,28 @@
+"""Coste por chequeo del token bucket en memoria"""
+
+import uuid
+from benchmarks.common import report, timeit
+from app.core.rate_limit import InMemoryRateLimitStore
+
+ITERATIONS = 1_000_000
+
+
+def main():
+    store = InMemoryRateLimitStore()
+    user_id = uuid.uuid4()
+    key = (user_id, "send_message")
+
+    # Rate alto para que todas las comprobaciones se acepten
+    report(
+        "consume (allowed)",
+        timeit(lambda: store.consume(key, 1e9, 1_000_000), ITERATIONS),
+    )
+    # Bucket vacío: todas las comprobaciones se rechazan
+    report(
+        "consume (rejected)",
+        timeit(lambda: store.consume(("other", "typing"), 1e-9, 1), ITERATIONS),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Tiempo de arranque y latencia de la primera petición con y sin lifespan.
+
+Cada caso se mide en un intérprete nuevo para partir de un proceso frío. La
+base de datos se rellena antes desde el proceso padre, así el proceso medido
+no calienta el pool ni los mappers al insertar los datos.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+from benchmarks.common import report, seed_user_with_chats
+
+STEADY_ITERATIONS = 50
+
+
+def child(lifespan: bool, headers: dict[str, str]):
+    start = time.perf_counter()
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    app.state.engine.echo = False
+    results = {"import": time.perf_counter() - start}
+
+    client = TestClient(app, base_url="http://localhost")
+    if lifespan:
+        start = time.perf_counter()
+        client.__enter__()
+        results["startup"] = time.perf_counter() - start
+    # La primera petición del TestClient arranca su hilo; no cuenta como latencia
+    client.get("/hello")
+
+    start = time.perf_counter()
+    client.get("/chat/", headers=headers)
+    results["first_request"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(STEADY_ITERATIONS):
+        client.get("/chat/", headers=headers)
+    results["steady_request"] = (time.perf_counter() - start) / STEADY_ITERATIONS
+
+    if lifespan:
+        client.__exit__(None, None, None)
+    print(json.dumps(results))
+
+
+def main():
+    from benchmarks.common import create_client
+
+    create_client()
+    _, headers = seed_user_with_chats(chats=50, messages_per_chat=10)
+
+    for lifespan in (False, True):
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_startup", "--child"],
+            input=json.dumps({"lifespan": lifespan, "headers": headers}),
+            capture_output=True,
+            text=True,
+            check=True,
+            env=os.environ,
+        ).stdout
+        results = json.loads(output.strip().splitlines()[-1])
+        label = "with lifespan" if lifespan else "without lifespan"
+        for name, seconds in results.items():
+            report(f"{label}: {name}", seconds)
+
+
+if __name__ == "__main__":
+    if "--child" in sys.argv:
+        config = json.loads(sys.stdin.read())
+        child(config["lifespan"], config["headers"])
+    else:
+        main()
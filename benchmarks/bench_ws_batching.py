@@ -0,0 +1,53 @@
+"""Frames y CPU para entregar ráfagas de eventos con y sin agrupación"""
+
+import asyncio
+import time
+import uuid
+from benchmarks.common import report
+from benchmarks.bench_group_fanout import FakeWebSocket
+from app.core.env_config import env
+from app.websockets.manager import ConnectionManager
+
+BURSTS = 2_000
+EVENTS_PER_BURST = 10
+
+
+async def bench(batch: bool):
+    manager = ConnectionManager(env.WS_BATCH_WINDOW_SECONDS, env.WS_BATCH_MAX_EVENTS)
+    receiver = uuid.uuid4()
+    websocket = FakeWebSocket()
+    await manager.connect_user(receiver, websocket, batch=batch)  # type: ignore
+
+    event = {
+        "type": "typing",
+        "chat_id": str(uuid.uuid4()),
+        "user_id": str(uuid.uuid4()),
+    }
+
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    for _ in range(BURSTS):
+        for _ in range(EVENTS_PER_BURST):
+            await manager.send_to_user(receiver, event)  # type: ignore
+        await asyncio.sleep(0)
+    # Espera a que se vacíe la última ventana
+    await asyncio.sleep(env.WS_BATCH_WINDOW_SECONDS * 2)
+    cpu = time.process_time() - cpu_start
+    wall = time.perf_counter() - wall_start
+
+    events = BURSTS * EVENTS_PER_BURST
+    label = "batching on " if batch else "batching off"
+    print(
+        f"{label}: {websocket.frames} frames for {events} events "
+        f"({websocket.frames / wall:.0f} frames/s, {websocket.bytes_sent} bytes)"
+    )
+    report(f"{label}: CPU per event", cpu / events)
+
+
+async def main():
+    await bench(batch=False)
+    await bench(batch=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,63 @@
+"""Bytes en el cable y CPU por mensaje `new_message` para cada codec de /ws.
+
+permessage-deflate se simula con zlib igual que lo aplica el servidor:
+deflate crudo con contexto compartido entre mensajes y Z_SYNC_FLUSH.
+"""
+
+import time
+import uuid
+import zlib
+from benchmarks.common import report
+from app.websockets.codecs import codecs
+
+MESSAGES = 20_000
+
+
+def make_messages(count: int) -> list[dict]:
+    chat_id = str(uuid.uuid4())
+    senders = [
+        {"id": str(uuid.uuid4()), "name": f"Usuario {i}", "email": f"user{i}@x.com"}
+        for i in range(5)
+    ]
+    return [
+        {
+            "type": "new_message",
+            "message_id": str(uuid.uuid4()),
+            "chat_id": chat_id,
+            "sender": senders[i % len(senders)],
+            "content": {
+                "message": f"Mensaje número {i} del chat",
+                "created_at": "2026-10-19 10:00:00.000000",
+            },
+        }
+        for i in range(count)
+    ]
+
+
+def main():
+    messages = make_messages(MESSAGES)
+
+    for subprotocol, codec in codecs.items():
+        start = time.perf_counter()
+        payloads = [codec.encode(message) for message in messages]
+        encode_time = (time.perf_counter() - start) / MESSAGES
+        raw = [p.encode() if isinstance(p, str) else p for p in payloads]
+
+        compressor = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+        start = time.perf_counter()
+        deflated = [
+            compressor.compress(p) + compressor.flush(zlib.Z_SYNC_FLUSH) for p in raw
+        ]
+        deflate_time = (time.perf_counter() - start) / MESSAGES
+
+        raw_size = sum(len(p) for p in raw) / MESSAGES
+        # permessage-deflate elimina los 4 bytes finales 00 00 ff ff
+        deflated_size = sum(len(p) - 4 for p in deflated) / MESSAGES
+
+        print(f"{subprotocol}: {raw_size:.0f} B/msg, deflate {deflated_size:.0f} B/msg")
+        report(f"{subprotocol} encode", encode_time)
+        report(f"{subprotocol} encode + deflate", encode_time + deflate_time)
+
+
+if __name__ == "__main__":
+    main()
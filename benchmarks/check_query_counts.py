@@ -0,0 +1,51 @@
+"""Comprueba que las rutas de lectura no superan su presupuesto de consultas.
+
+El número de consultas no debe crecer con el número de chats o mensajes, así
+que una regresión N+1 hace que el script termine con código 1:
+
+    python -m benchmarks.check_query_counts
+"""
+
+import sys
+from benchmarks.common import create_client, seed_user_with_chats
+
+
+def main():
+    from app.core.env_config import env
+    from app.core.tracing import assert_max_queries
+
+    # Los datos se acaban de crear: sin margen /sync los devuelve ya
+    env.SYNC_SAFETY_WINDOW_SECONDS = 0
+    client = create_client()
+    user_id, headers = seed_user_with_chats(chats=20, messages_per_chat=10)
+    chat_id = client.get("/chat/", headers=headers).json()[0]["id"]
+    cursor = client.get("/sync", headers=headers).json()["cursor"]
+
+    # (método, url, cuerpo, máximo de consultas)
+    budgets = [
+        ("GET", "/chat/", None, 3),
+        ("GET", f"/chat/{chat_id}", None, 4),
+        ("GET", f"/chat/{chat_id}/messages", None, 4),
+        ("GET", "/sync", None, 2),
+        ("GET", f"/sync?since={cursor}", None, 6),
+        ("GET", "/users/search?prefix=contact", None, 2),
+        ("POST", "/users/batch", {"ids": [str(user_id)]}, 1),
+    ]
+
+    failed = False
+    for method, url, body, max_queries in budgets:
+        try:
+            with assert_max_queries(max_queries, client.app.state.engine) as statements:
+                response = client.request(method, url, headers=headers, json=body)
+                assert response.status_code == 200, response.text
+        except AssertionError as e:
+            failed = True
+            print(f"FAIL {method} {url}: {e}")
+        else:
+            print(f"ok   {method} {url}: {len(statements)}/{max_queries} queries")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Comprueba que el buffer de confirmaciones se queda con la última marca.
+
+Un cliente que se pone al día confirma muchos mensajes seguidos en un mismo
+intervalo; la marca escrita debe ser la del último, no la del último que
+cupo en el buffer. Termina con código 1 si no es así:
+
+    python -m benchmarks.check_receipts
+"""
+
+import asyncio
+import sys
+from datetime import datetime, timedelta
+from benchmarks.common import create_client
+
+MESSAGES = 100
+
+
+async def run() -> bool:
+    from sqlmodel import Session, select
+    from app.main import app
+    from app.models.chat_model import Chat, ChatUser, Message
+    from app.models.user_model import User
+    from app.websockets.receipts import ReceiptBuffer
+
+    engine = app.state.engine
+
+    with Session(engine) as session:
+        reader = User(name="Reader", email="reader@bench.com", hashed_password="-")
+        sender = User(name="Sender", email="sender@bench.com", hashed_password="-")
+        chat = Chat(name="Receipts")
+        start = datetime(2026, 1, 1)
+        messages = [
+            Message(
+                chat_id=chat.id,
+                sender_id=sender.id,
+                content=f"Mensaje {i}",
+                sent_at=start + timedelta(seconds=i),
+            )
+            for i in range(MESSAGES)
+        ]
+        session.add_all(
+            [
+                reader,
+                sender,
+                chat,
+                ChatUser(chat_id=chat.id, user_id=reader.id),
+                ChatUser(chat_id=chat.id, user_id=sender.id),
+                *messages,
+            ]
+        )
+        session.commit()
+        chat_id, reader_id = chat.id, reader.id
+        message_ids = [message.id for message in messages]
+        expected = messages[-1].sent_at
+
+    # Todas las confirmaciones, de la más antigua a la más nueva, en un intervalo
+    buffer = ReceiptBuffer(engine, app.state.manager, flush_seconds=3600)
+    for message_id in message_ids:
+        buffer.record(chat_id, reader_id, message_id, read=True)
+    await buffer.close()
+
+    with Session(engine) as session:
+        delivered_until, read_until = session.exec(
+            select(ChatUser.delivered_until, ChatUser.read_until)
+            .where(ChatUser.chat_id == chat_id)
+            .where(ChatUser.user_id == reader_id)
+        ).one()
+
+    ok = delivered_until == expected and read_until == expected
+    status = "ok  " if ok else "FAIL"
+    print(
+        f"{status} {MESSAGES} ordered acks: read_until={read_until} "
+        f"delivered_until={delivered_until} (expected {expected})"
+    )
+    return ok
+
+
+def main():
+    create_client()
+    sys.exit(0 if asyncio.run(run()) else 1)
+
+
+if __name__ == "__main__":
+    main()
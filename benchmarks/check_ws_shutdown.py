@@ -0,0 +1,92 @@
+"""Comprueba que al apagar uvicorn no se pierden los mensajes encolados en /ws.
+
+uvicorn cierra los /ws y espera a que terminen sus endpoints antes del
+shutdown del lifespan, así que las colas se vacían en el `finally` del
+endpoint y `close_all` ya no encuentra conexiones. Termina con código 1 si
+falta algún mensaje o si quedaban conexiones al llegar al lifespan:
+
+    python -m benchmarks.check_ws_shutdown
+"""
+
+import asyncio
+import json
+import sys
+import threading
+import time
+from benchmarks.common import app_engine, create_client, seed_user_with_chats
+
+MESSAGES = 20
+
+
+async def send_and_shutdown(server, port: int, token: str, chat_id: str):
+    import websockets
+
+    async with websockets.connect(f"ws://127.0.0.1:{port}/ws?token={token}") as ws:
+        for i in range(MESSAGES):
+            frame = {
+                "type": "send_message",
+                "chat_id": chat_id,
+                "content": {"message": f"Mensaje {i}"},
+            }
+            await ws.send(json.dumps(frame))
+        # Se pide el apagado con los mensajes todavía en la cola de la conexión
+        server.should_exit = True
+        try:
+            while True:
+                await ws.recv()
+        except websockets.ConnectionClosed:
+            pass
+
+
+def main():
+    import uvicorn
+    from sqlmodel import Session, func, select
+    from app.main import app
+    from app.models.chat_model import ChatUser, Message
+
+    create_client()
+    user_id, headers = seed_user_with_chats(chats=1)
+    token = headers["Authorization"].removeprefix("Bearer ")
+    with Session(app_engine()) as session:
+        chat_id = str(
+            session.exec(
+                select(ChatUser.chat_id).where(ChatUser.user_id == user_id)
+            ).one()
+        )
+
+    manager = app.state.manager
+    close_all = manager.close_all
+    left_at_shutdown: list[int] = []
+
+    async def recording_close_all(*args, **kwargs):
+        left_at_shutdown.append(len(manager.user_connections))
+        await close_all(*args, **kwargs)
+
+    manager.close_all = recording_close_all
+
+    server = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=0, log_level="warning")
+    )
+    thread = threading.Thread(target=server.run)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    port = server.servers[0].sockets[0].getsockname()[1]
+
+    asyncio.run(send_and_shutdown(server, port, token, chat_id))
+    thread.join()
+
+    with Session(app_engine()) as session:
+        saved = session.exec(select(func.count()).select_from(Message)).one()
+
+    ok = saved == MESSAGES and left_at_shutdown == [0]
+    status = "ok  " if ok else "FAIL"
+    print(
+        f"{status} saved {saved}/{MESSAGES} queued messages, "
+        f"connections left at lifespan shutdown: {left_at_shutdown}"
+    )
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Utilidades compartidas por los benchmarks.
+
+Se ejecutan desde la raíz del repo, por ejemplo:
+
+    python -m benchmarks.bench_rate_limit
+"""
+
+import os
+import tempfile
+import time
+import uuid
+from collections.abc import Callable
+
+# Configuración mínima para poder importar `app` sin un .env. Se usa un
+# fichero SQLite temporal porque TestClient atiende las peticiones sync desde
+# otro hilo y una base de datos en memoria no se comparte entre conexiones.
+_db_path = os.path.join(tempfile.mkdtemp(prefix="chat-bench-"), "bench.sqlite")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_db_path}")
+os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+os.environ.setdefault("ALGORITHM", "HS256")
+
+
+def timeit(fn: Callable[[], object], iterations: int) -> float:
+    """Devuelve el tiempo medio por iteración en segundos"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations
+
+
+def report(name: str, seconds: float):
+    if seconds < 1e-3:
+        print(f"{name:<45} {seconds * 1e9:>10.1f} ns")
+    else:
+        print(f"{name:<45} {seconds * 1e3:>10.3f} ms")
+
+
+def app_engine():
+    """Motor de la aplicación que prueban los benchmarks (app.main:app)"""
+    from app.main import app
+
+    return app.state.engine
+
+
+def create_client():
+    """Crea las tablas y devuelve un TestClient con el rate limiting desactivado"""
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.core.env_config import env
+    from app.db.session import init_db
+
+    app.state.engine.echo = False
+    env.RATE_LIMIT_ENABLED = False
+    init_db(app.state.engine)
+    return TestClient(app, base_url="http://localhost")
+
+
+def seed_user_with_chats(
+    chats: int, messages_per_chat: int = 0
+) -> tuple[uuid.UUID, dict[str, str]]:
+    """Inserta un usuario con `chats` chats directos y devuelve (id, headers)"""
+    from datetime import timedelta
+    from sqlmodel import Session
+    from app.models.chat_model import Chat, ChatUser, Message
+    from app.models.user_model import User
+    from app.routers.auth_router import create_access_token
+
+    with Session(app_engine()) as session:
+        user = User(
+            name="Bench", email=f"{uuid.uuid4()}@bench.com", hashed_password="-"
+        )
+        session.add(user)
+        for i in range(chats):
+            other = User(
+                name=f"Contact {i}",
+                email=f"{uuid.uuid4()}@bench.com",
+                hashed_password="-",
+            )
+            chat = Chat(name=f"Direct chat {i}")
+            session.add_all(
+                [
+                    other,
+                    chat,
+                    ChatUser(chat_id=chat.id, user_id=user.id),
+                    ChatUser(chat_id=chat.id, user_id=other.id),
+                ]
+            )
+            session.add_all(
+                Message(chat_id=chat.id, sender_id=other.id, content=f"Mensaje {j}")
+                for j in range(messages_per_chat)
+            )
+        session.commit()
+
+        token = create_access_token(
+            {"id": str(user.id), "email": user.email, "name": user.name},
+            expires_delta=timedelta(minutes=30),
+        )
+        return user.id, {"Authorization": f"Bearer {token}"}
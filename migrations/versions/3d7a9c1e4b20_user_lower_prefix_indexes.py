@@ -0,0 +1,45 @@
+# type: ignore
+"""user lower prefix indexes
+
+Revision ID: 3d7a9c1e4b20
+Revises: ab0ba51e5ce7
+Create Date: 2026-10-19 09:12:31.504118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3d7a9c1e4b20'
+down_revision: Union[str, Sequence[str], None] = 'ab0ba51e5ce7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # text_pattern_ops solo existe en Postgres (permite LIKE 'prefijo%' con
+    # cualquier collation); en el resto basta con el índice de la expresión
+    bind = op.get_bind()
+    opclass = ' text_pattern_ops' if bind.dialect.name == 'postgresql' else ''
+    op.create_index(
+        'ix_user_name_lower',
+        'user',
+        [sa.text(f'lower(name){opclass}')],
+        unique=False,
+    )
+    op.create_index(
+        'ix_user_email_lower',
+        'user',
+        [sa.text(f'lower(email){opclass}')],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_user_email_lower', table_name='user')
+    op.drop_index('ix_user_name_lower', table_name='user')
@@ -0,0 +1,31 @@
+# type: ignore
+"""chat and user versions
+
+Revision ID: 7b2e5f08c913
+Revises: 3d7a9c1e4b20
+Create Date: 2026-10-19 10:04:12.218734
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7b2e5f08c913'
+down_revision: Union[str, Sequence[str], None] = '3d7a9c1e4b20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('chat', sa.Column('version', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('user', sa.Column('chats_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('user', 'chats_version')
+    op.drop_column('chat', 'version')
@@ -0,0 +1,115 @@
+# type: ignore
+"""message time partitions
+
+Convierte `message` en una tabla particionada por rango de `sent_at` (una
+partición por mes) en Postgres. La clave primaria pasa a ser (id, sent_at),
+como exige el particionado, así que `attachment.message_id` deja de tener
+clave foránea. En otros motores no hace nada.
+
+Revision ID: 9c3e7a41d8b5
+Revises: 5a9d2c7e1f36
+Create Date: 2026-10-19 18:22:15.904113
+
+"""
+from datetime import datetime, timedelta
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c3e7a41d8b5'
+down_revision: Union[str, Sequence[str], None] = '5a9d2c7e1f36'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _next_month(value: datetime) -> datetime:
+    return (value.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+
+    op.drop_constraint('attachment_message_id_fkey', 'attachment', type_='foreignkey')
+
+    op.execute('ALTER TABLE message RENAME TO message_unpartitioned')
+    op.execute('ALTER TABLE message_unpartitioned RENAME CONSTRAINT message_pkey TO message_unpartitioned_pkey')
+    op.execute('ALTER INDEX ix_message_chat_id_sent_at RENAME TO ix_message_unpartitioned_chat_id_sent_at')
+    op.execute('ALTER INDEX ix_message_sent_at RENAME TO ix_message_unpartitioned_sent_at')
+
+    op.execute(
+        'CREATE TABLE message ('
+        ' id UUID NOT NULL,'
+        ' content VARCHAR NOT NULL,'
+        ' sent_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,'
+        ' chat_id UUID NOT NULL REFERENCES chat (id),'
+        ' sender_id UUID NOT NULL REFERENCES "user" (id),'
+        ' PRIMARY KEY (id, sent_at)'
+        ') PARTITION BY RANGE (sent_at)'
+    )
+
+    # Una partición por mes desde el mensaje más antiguo hasta dos meses vista;
+    # la partición por defecto recoge lo que quede fuera
+    oldest = bind.execute(sa.text('SELECT min(sent_at) FROM message_unpartitioned')).scalar()
+    now = datetime.now()
+    start = (oldest or now).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    last = _next_month(_next_month(_next_month(now.replace(day=1))))
+    while start < last:
+        end = _next_month(start)
+        op.execute(
+            f"CREATE TABLE message_p{start:%Y%m} PARTITION OF message "
+            f"FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{end:%Y-%m-%d}')"
+        )
+        start = end
+    op.execute('CREATE TABLE message_default PARTITION OF message DEFAULT')
+
+    op.execute(
+        'INSERT INTO message (id, content, sent_at, chat_id, sender_id) '
+        'SELECT id, content, sent_at, chat_id, sender_id FROM message_unpartitioned'
+    )
+    op.execute('DROP TABLE message_unpartitioned')
+
+    op.create_index('ix_message_chat_id_sent_at', 'message', ['chat_id', 'sent_at', 'id'], unique=False)
+    op.create_index(op.f('ix_message_sent_at'), 'message', ['sent_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+
+    op.execute('ALTER TABLE message RENAME TO message_partitioned')
+    op.execute('ALTER INDEX ix_message_chat_id_sent_at RENAME TO ix_message_partitioned_chat_id_sent_at')
+    op.execute('ALTER INDEX ix_message_sent_at RENAME TO ix_message_partitioned_sent_at')
+    op.execute('ALTER TABLE message_partitioned RENAME CONSTRAINT message_pkey TO message_partitioned_pkey')
+
+    op.create_table('message',
+    sa.Column('id', sa.Uuid(), nullable=False),
+    sa.Column('content', sa.String(), nullable=False),
+    sa.Column('sent_at', sa.DateTime(), nullable=False),
+    sa.Column('chat_id', sa.Uuid(), nullable=False),
+    sa.Column('sender_id', sa.Uuid(), nullable=False),
+    sa.ForeignKeyConstraint(['chat_id'], ['chat.id'], ),
+    sa.ForeignKeyConstraint(['sender_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.execute(
+        'INSERT INTO message (id, content, sent_at, chat_id, sender_id) '
+        'SELECT id, content, sent_at, chat_id, sender_id FROM message_partitioned'
+    )
+    op.execute('DROP TABLE message_partitioned CASCADE')
+
+    op.create_index('ix_message_chat_id_sent_at', 'message', ['chat_id', 'sent_at', 'id'], unique=False)
+    op.create_index(op.f('ix_message_sent_at'), 'message', ['sent_at'], unique=False)
+    # Los adjuntos de mensajes archivados no tienen fila en `message`
+    op.execute(
+        'UPDATE attachment SET message_id = NULL '
+        'WHERE message_id IS NOT NULL AND message_id NOT IN (SELECT id FROM message)'
+    )
+    op.create_foreign_key('attachment_message_id_fkey', 'attachment', 'message', ['message_id'], ['id'])
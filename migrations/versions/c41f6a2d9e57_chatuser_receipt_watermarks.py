@@ -0,0 +1,31 @@
+# type: ignore
+"""chatuser receipt watermarks
+
+Revision ID: c41f6a2d9e57
+Revises: 7b2e5f08c913
+Create Date: 2026-10-19 12:41:55.730912
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41f6a2d9e57'
+down_revision: Union[str, Sequence[str], None] = '7b2e5f08c913'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('chatuser', sa.Column('delivered_until', sa.DateTime(), nullable=True))
+    op.add_column('chatuser', sa.Column('read_until', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('chatuser', 'read_until')
+    op.drop_column('chatuser', 'delivered_until')